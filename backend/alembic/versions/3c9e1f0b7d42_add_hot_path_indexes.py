@@ -0,0 +1,57 @@
+"""add hot path indexes
+
+Revision ID: 3c9e1f0b7d42
+Revises: a751405f82ba
+Create Date: 2026-10-18 09:12:40.118306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f0b7d42'
+down_revision = 'a751405f82ba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    _dedupe_group_members()
+    with op.batch_alter_table("expense_group_members") as batch_op:
+        batch_op.alter_column("group_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key("pk_expense_group_members", ["group_id", "user_id"])
+    op.create_index("ix_expense_group_members_user_id", "expense_group_members", ["user_id"])
+    op.create_index("ix_expense_group_id_date", "expense", ["group_id", "date"])
+    op.create_index("ix_expense_author_id", "expense", ["author_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_expense_author_id", table_name="expense")
+    op.drop_index("ix_expense_group_id_date", table_name="expense")
+    op.drop_index("ix_expense_group_members_user_id", table_name="expense_group_members")
+    with op.batch_alter_table("expense_group_members") as batch_op:
+        batch_op.drop_constraint("pk_expense_group_members", type_="primary")
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column("group_id", existing_type=sa.Integer(), nullable=True)
+
+
+def _dedupe_group_members() -> None:
+    """
+    Drops duplicate and incomplete membership rows so the primary key can be created
+    """
+    members = sa.table(
+        "expense_group_members",
+        sa.column("group_id", sa.Integer()),
+        sa.column("user_id", sa.Integer()),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(members.c.group_id, members.c.user_id)
+        .where(members.c.group_id.is_not(None), members.c.user_id.is_not(None))
+        .distinct()
+    ).all()
+    bind.execute(sa.delete(members))
+    if rows:
+        bind.execute(sa.insert(members), [{"group_id": group_id, "user_id": user_id} for group_id, user_id in rows])
@@ -0,0 +1,48 @@
+"""add expense change tracking
+
+Revision ID: 5f0c8e3b6a27
+Revises: e4a7c2d91f36
+Create Date: 2026-10-18 15:02:44.903127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0c8e3b6a27'
+down_revision = 'e4a7c2d91f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("expense") as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("updated_date", sa.DateTime(), nullable=True))
+    # existing expenses are treated as last changed by their group's current version
+    op.execute(
+        "UPDATE expense SET updated_date = date, "
+        "version = (SELECT version FROM expense_group WHERE expense_group.id = expense.group_id)"
+    )
+    with op.batch_alter_table("expense") as batch_op:
+        batch_op.alter_column("updated_date", existing_type=sa.DateTime(), nullable=False)
+    op.create_index("ix_expense_group_id_version", "expense", ["group_id", "version"])
+
+    op.create_table(
+        "expense_tombstone",
+        sa.Column("expense_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("expense_group.id"), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("deleted_date", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_expense_tombstone_group_id_version", "expense_tombstone", ["group_id", "version"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_expense_tombstone_group_id_version", table_name="expense_tombstone")
+    op.drop_table("expense_tombstone")
+    op.drop_index("ix_expense_group_id_version", table_name="expense")
+    with op.batch_alter_table("expense") as batch_op:
+        batch_op.drop_column("updated_date")
+        batch_op.drop_column("version")
@@ -0,0 +1,51 @@
+"""add group balances
+
+Revision ID: 7d2b5e4a9c13
+Revises: 3c9e1f0b7d42
+Create Date: 2026-10-18 11:40:02.554190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2b5e4a9c13'
+down_revision = '3c9e1f0b7d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("expense_group_members") as batch_op:
+        batch_op.add_column(sa.Column("joined_date", sa.DateTime(), nullable=True))
+    # existing members are treated as having joined when their group was created
+    op.execute(
+        "UPDATE expense_group_members SET joined_date = "
+        "(SELECT created_date FROM expense_group WHERE expense_group.id = expense_group_members.group_id)"
+    )
+    with op.batch_alter_table("expense_group_members") as batch_op:
+        batch_op.alter_column("joined_date", existing_type=sa.DateTime(), nullable=False)
+
+    op.create_table(
+        "expense_group_balance",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("expense_group.id"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), primary_key=True),
+        sa.Column("balance", sa.Float(), nullable=False),
+    )
+    # each member is credited what they paid and debited an even share of every expense made since they joined
+    op.execute(
+        "INSERT INTO expense_group_balance (group_id, user_id, balance) "
+        "SELECT m.group_id, m.user_id, "
+        "COALESCE((SELECT SUM(e.price) FROM expense e WHERE e.group_id = m.group_id AND e.author_id = m.user_id), 0) "
+        "- COALESCE((SELECT SUM(e.price / (SELECT COUNT(*) FROM expense_group_members p "
+        "WHERE p.group_id = e.group_id AND p.joined_date <= e.date)) "
+        "FROM expense e WHERE e.group_id = m.group_id AND e.date >= m.joined_date), 0) "
+        "FROM expense_group_members m"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("expense_group_balance")
+    with op.batch_alter_table("expense_group_members") as batch_op:
+        batch_op.drop_column("joined_date")
@@ -0,0 +1,43 @@
+"""store balances as decimal
+
+Revision ID: 9a4d6f1e8b53
+Revises: 5f0c8e3b6a27
+Create Date: 2026-10-18 19:05:31.417620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d6f1e8b53'
+down_revision = '5f0c8e3b6a27'
+branch_labels = None
+depends_on = None
+
+# share of an expense charged to each member who was in the group when it was made, rounded to the cent
+_SHARE = (
+    "ROUND(e.price / (SELECT COUNT(*) FROM expense_group_members p "
+    "WHERE p.group_id = e.group_id AND p.joined_date <= e.date), 2)"
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("expense_group_balance") as batch_op:
+        batch_op.alter_column("balance", existing_type=sa.Float(), type_=sa.Numeric(12, 2), existing_nullable=False)
+    # balances are rebuilt from rounded shares, authors are credited what their expenses' shares add up to
+    op.execute(
+        "UPDATE expense_group_balance SET balance = "
+        f"COALESCE((SELECT SUM({_SHARE} * (SELECT COUNT(*) FROM expense_group_members p "
+        "WHERE p.group_id = e.group_id AND p.joined_date <= e.date)) "
+        "FROM expense e WHERE e.group_id = expense_group_balance.group_id "
+        "AND e.author_id = expense_group_balance.user_id), 0) "
+        f"- COALESCE((SELECT SUM({_SHARE}) FROM expense e "
+        "JOIN expense_group_members m ON m.group_id = e.group_id AND m.user_id = expense_group_balance.user_id "
+        "WHERE e.group_id = expense_group_balance.group_id AND e.date >= m.joined_date), 0)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("expense_group_balance") as batch_op:
+        batch_op.alter_column("balance", existing_type=sa.Numeric(12, 2), type_=sa.Float(), existing_nullable=False)
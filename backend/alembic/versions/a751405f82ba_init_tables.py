@@ -8,9 +8,6 @@ Create Date: 2023-07-18 21:36:22.917572
 from alembic import op
 import sqlalchemy as sa
 
-from components.db import get_engine
-from components.models.orm_models import Base
-
 
 # revision identifiers, used by Alembic.
 revision = 'a751405f82ba'
@@ -20,9 +17,47 @@ depends_on = None
 
 
 def upgrade() -> None:
-    engine = get_engine()
-    Base.metadata.create_all(engine)
+    op.create_table(
+        "user",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(255), nullable=False, unique=True),
+        sa.Column("first_name", sa.String(255), nullable=False),
+        sa.Column("last_name", sa.String(255), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False),
+    )
+    op.create_table(
+        "auth_user",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), primary_key=True),
+        sa.Column("username", sa.String(255), nullable=False, unique=True),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+    )
+    op.create_table(
+        "expense_group",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("author_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("created_date", sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        "expense",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(255), nullable=False),
+        sa.Column("description", sa.String(255), nullable=True),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("author_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("expense_group.id"), nullable=False),
+    )
+    op.create_table(
+        "expense_group_members",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("expense_group.id")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id")),
+    )
 
 
 def downgrade() -> None:
-    pass
+    op.drop_table("expense_group_members")
+    op.drop_table("expense")
+    op.drop_table("expense_group")
+    op.drop_table("auth_user")
+    op.drop_table("user")
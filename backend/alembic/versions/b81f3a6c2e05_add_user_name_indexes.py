@@ -0,0 +1,26 @@
+"""add user name indexes
+
+Revision ID: b81f3a6c2e05
+Revises: 7d2b5e4a9c13
+Create Date: 2026-10-18 13:05:51.730412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f3a6c2e05'
+down_revision = '7d2b5e4a9c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_user_first_name", "user", ["first_name"])
+    op.create_index("ix_user_last_name", "user", ["last_name"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_last_name", table_name="user")
+    op.drop_index("ix_user_first_name", table_name="user")
@@ -0,0 +1,31 @@
+"""add group versions
+
+Revision ID: e4a7c2d91f36
+Revises: b81f3a6c2e05
+Create Date: 2026-10-18 14:21:37.118264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d91f36'
+down_revision = 'b81f3a6c2e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("expense_group") as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+        batch_op.add_column(sa.Column("modified_date", sa.DateTime(), nullable=True))
+    op.execute("UPDATE expense_group SET modified_date = created_date")
+    with op.batch_alter_table("expense_group") as batch_op:
+        batch_op.alter_column("modified_date", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("expense_group") as batch_op:
+        batch_op.drop_column("modified_date")
+        batch_op.drop_column("version")
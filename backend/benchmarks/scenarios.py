@@ -0,0 +1,124 @@
+import json
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from benchmarks.seed import Dataset
+
+MAX_WATERMARK = 2 ** 62
+BULK_ROWS = 100
+MULTIPART_BOUNDARY = "expense-tracker-benchmark"
+
+
+class Scenario:
+    """
+    A request to benchmark repeatedly. Path, query and body are built per iteration so writes can vary
+    """
+
+    def __init__(
+        self,
+        name: str,
+        method: str,
+        path: Callable[[int], str],
+        params: Optional[Callable[[int], Dict[str, Any]]] = None,
+        body: Optional[Callable[[int], Any]] = None,
+        csv_file: Optional[Callable[[int], str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        expected_status: Optional[Set[int]] = None,
+        weight: float = 1,
+        rows: int = 0,
+    ):
+        self.name = name
+        self.method = method
+        self._path = path
+        self._params = params
+        self._body = body
+        self._csv_file = csv_file
+        self.headers = headers or {}
+        self.expected_status = expected_status or {200}
+        # fraction of the configured request count to run, heavy scenarios run fewer requests
+        self.weight = weight
+        # rows each request writes, scenarios that write rows also report rows per second
+        self.rows = rows
+
+    def build(self, iteration: int) -> Tuple[str, Optional[bytes], Dict[str, str]]:
+        """
+        Builds the request for an iteration
+
+        :param iteration: index of the request within the scenario
+        :return url, body and headers
+        """
+        url = self._path(iteration)
+        if self._params is not None:
+            url = f"{url}?{urlencode(self._params(iteration), doseq=True)}"
+        headers = dict(self.headers)
+        body = None
+        if self._body is not None:
+            body = json.dumps(self._body(iteration)).encode()
+            headers["Content-Type"] = "application/json"
+        if self._csv_file is not None:
+            body = _multipart_file("file", "expenses.csv", self._csv_file(iteration))
+            headers["Content-Type"] = f"multipart/form-data; boundary={MULTIPART_BOUNDARY}"
+        return url, body, headers
+
+
+def build_scenarios(dataset: Dataset, auth: Dict[str, str], fetch: Callable[[str, Dict[str, str]], Tuple[int, Dict[str, str], bytes]]) -> List[Scenario]:
+    """
+    Builds every benchmark scenario, reads first so that writes cannot disturb them
+
+    :param dataset: description of the seeded data
+    :param auth: authorization header of the benchmark user
+    :param fetch: performs a GET, used to read the validators conditional scenarios replay
+    :return scenarios in the order they should run
+    """
+    group = dataset.hot_group_id
+    _, expense_headers, _ = fetch(f"/groups/{group}/expenses?limit=1", auth)
+    _, _, changes = fetch(f"/groups/{group}/expenses/changes?since={MAX_WATERMARK}", auth)
+    watermark = json.loads(changes)["watermark"]
+    expense_ids = dataset.expense_ids
+
+    return [
+        Scenario("users_page", "GET", lambda i: "/users", lambda i: {"limit": 100}, headers=auth),
+        Scenario("users_search", "GET", lambda i: "/users", lambda i: {"search": f"user{i % 100}", "limit": 50}, headers=auth),
+        Scenario("me", "GET", lambda i: "/users/me", headers=auth),
+        Scenario("groups", "GET", lambda i: "/groups", headers=auth),
+        Scenario("group", "GET", lambda i: f"/groups/{group}", headers=auth),
+        Scenario("group_members", "GET", lambda i: f"/groups/{group}/members", headers=auth),
+        Scenario("expenses_page", "GET", lambda i: f"/groups/{group}/expenses", lambda i: {"limit": 1000}, headers=auth),
+        Scenario(
+            "expenses_not_modified", "GET", lambda i: f"/groups/{group}/expenses", lambda i: {"limit": 1000},
+            headers={**auth, "If-None-Match": expense_headers["etag"]}, expected_status={304},
+        ),
+        Scenario("expenses_stream", "GET", lambda i: f"/groups/{group}/expenses", lambda i: {"stream": "true"}, headers=auth, weight=0.05),
+        Scenario("expense_changes", "GET", lambda i: f"/groups/{group}/expenses/changes", lambda i: {"since": watermark}, headers=auth),
+        Scenario("summary", "GET", lambda i: f"/groups/{group}/summary", lambda i: {"bucket": "month"}, headers=auth, weight=0.2),
+        Scenario("balances", "GET", lambda i: f"/groups/{group}/balances", headers=auth),
+        Scenario("settlement", "GET", lambda i: f"/groups/{group}/settlement", headers=auth),
+        Scenario(
+            "create_expense", "POST", lambda i: f"/groups/{group}/expenses",
+            lambda i: {"title": f"benchmark {i}", "price": 10 + i % 50}, headers=auth,
+        ),
+        Scenario(
+            "update_expense", "PATCH", lambda i: f"/expenses/{expense_ids[i % len(expense_ids)]}",
+            lambda i: {"title": f"edited {i}"}, headers=auth,
+        ),
+        Scenario(
+            "bulk_create_expenses", "POST", lambda i: f"/groups/{group}/expenses/bulk",
+            body=lambda i: [{"title": f"bulk {i}.{j}", "price": 5 + j} for j in range(BULK_ROWS)],
+            headers=auth, weight=0.1, rows=BULK_ROWS,
+        ),
+        Scenario(
+            "import_expenses", "POST", lambda i: f"/groups/{group}/expenses/import",
+            csv_file=lambda i: "title,price,description\n" + "".join(f"import {i}.{j},{5 + j},\n" for j in range(BULK_ROWS)),
+            headers=auth, weight=0.1, rows=BULK_ROWS,
+        ),
+    ]
+
+
+def _multipart_file(field: str, filename: str, content: str) -> bytes:
+    return (
+        f"--{MULTIPART_BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+        f"{content}\r\n"
+        f"--{MULTIPART_BOUNDARY}--\r\n"
+    ).encode()
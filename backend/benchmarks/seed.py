@@ -0,0 +1,159 @@
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, List, Tuple
+
+from passlib.context import CryptContext
+from pydantic import BaseModel
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from components.daos.balance_dao import BALANCE_UNIT
+from components.models.orm_models import (AuthUserTbl, Base,
+                                          ExpenseGroupBalanceTbl,
+                                          ExpenseGroupMembersTbl,
+                                          ExpenseGroupTbl, ExpenseTbl, UserTbl)
+
+PASSWORD = "benchmark"
+BATCH_SIZE = 5000
+# share of all expenses that land in the first group, which every listing benchmark reads
+HOT_GROUP_SHARE = 0.2
+
+
+class SeedConfig(BaseModel):
+    """
+    Represents the data volume to seed
+    """
+    users: int = 1000
+    groups: int = 200
+    members_per_group: int = 8
+    expenses: int = 100000
+    random_seed: int = 0
+
+
+class Dataset(BaseModel):
+    """
+    Represents what the benchmarks need to know about the seeded data
+    """
+    username: str
+    password: str
+    user_id: int
+    hot_group_id: int
+    group_ids: List[int]
+    expense_ids: List[int]
+
+
+def seed(engine: Engine, config: SeedConfig) -> Dataset:
+    """
+    Creates the schema and fills it with deterministic data, unless it already holds users
+
+    :param engine: engine for the database being benchmarked
+    :param config: data volume to seed
+    :return description of the seeded data
+    """
+    Base.metadata.create_all(engine)
+    rng = random.Random(config.random_seed)
+    with engine.begin() as connection:
+        if connection.scalar(select(func.count()).select_from(UserTbl)) == 0:
+            _seed_rows(connection, config, rng)
+        user_id = connection.scalar(select(UserTbl.id).order_by(UserTbl.id).limit(1))
+        username = connection.scalar(select(UserTbl.username).where(UserTbl.id == user_id))
+        group_ids = list(connection.scalars(
+            select(ExpenseGroupMembersTbl.c.group_id)
+            .where(ExpenseGroupMembersTbl.c.user_id == user_id)
+            .order_by(ExpenseGroupMembersTbl.c.group_id)
+        ))
+        expense_ids = list(connection.scalars(
+            select(ExpenseTbl.id).where(ExpenseTbl.author_id == user_id).order_by(ExpenseTbl.id).limit(1000)
+        ))
+    return Dataset(
+        username=username,
+        password=PASSWORD,
+        user_id=user_id,
+        hot_group_id=group_ids[0],
+        group_ids=group_ids,
+        expense_ids=expense_ids,
+    )
+
+
+def _seed_rows(connection: Connection, config: SeedConfig, rng: random.Random) -> None:
+    hashed_password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD)
+    names = ["alex", "blake", "casey", "drew", "emery", "finley", "gray", "harper", "indigo", "jordan"]
+    user_ids = list(range(1, config.users + 1))
+    _insert(connection, UserTbl, [
+        {
+            "id": id,
+            "username": f"user{id}",
+            "first_name": rng.choice(names).title(),
+            "last_name": rng.choice(names).title(),
+            "email": f"user{id}@example.com",
+        }
+        for id in user_ids
+    ])
+    _insert(connection, AuthUserTbl, [
+        {"user_id": id, "username": f"user{id}", "hashed_password": hashed_password}
+        for id in user_ids
+    ])
+
+    created_date = datetime.utcnow() - timedelta(days=365)
+    group_ids = list(range(1, config.groups + 1))
+    members: Dict[int, List[int]] = {}
+    group_size = min(config.members_per_group, len(user_ids) - 1)
+    for group_id in group_ids:
+        # the benchmark user authors every tenth group, including the hot first group
+        if group_id % 10 == 1:
+            members[group_id] = [user_ids[0], *rng.sample(user_ids[1:], group_size - 1)]
+        else:
+            members[group_id] = rng.sample(user_ids[1:], group_size)
+    _insert(connection, ExpenseGroupTbl, [
+        {
+            "id": group_id,
+            "name": f"group {group_id}",
+            "author_id": members[group_id][0],
+            "created_date": created_date,
+            "version": 1,
+            "modified_date": created_date,
+        }
+        for group_id in group_ids
+    ])
+    _insert(connection, ExpenseGroupMembersTbl, [
+        {"group_id": group_id, "user_id": user_id, "joined_date": created_date}
+        for group_id in group_ids
+        for user_id in members[group_id]
+    ])
+
+    balances: Dict[Tuple[int, int], Decimal] = defaultdict(Decimal)
+    expenses = []
+    hot_expenses = int(config.expenses * HOT_GROUP_SHARE)
+    for i in range(config.expenses):
+        group_id = group_ids[0] if i < hot_expenses else rng.choice(group_ids)
+        author_id = rng.choice(members[group_id])
+        price = round(rng.uniform(1, 200), 2)
+        date = created_date + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        expenses.append({
+            "title": f"expense {i}",
+            "description": None if i % 3 else f"description {i}",
+            "price": price,
+            "date": date,
+            "author_id": author_id,
+            "group_id": group_id,
+            "version": 1,
+            "updated_date": date,
+        })
+        # split the same way balance_dao does, so the seeded balances match what the app would have written
+        share = (Decimal(str(price)) / len(members[group_id])).quantize(BALANCE_UNIT, rounding=ROUND_HALF_UP)
+        balances[(group_id, author_id)] += share * len(members[group_id])
+        for member_id in members[group_id]:
+            balances[(group_id, member_id)] -= share
+    _insert(connection, ExpenseTbl, expenses)
+    _insert(connection, ExpenseGroupBalanceTbl, [
+        {"group_id": group_id, "user_id": user_id, "balance": balances[(group_id, user_id)]}
+        for group_id in group_ids
+        for user_id in members[group_id]
+    ])
+
+
+def _insert(connection: Connection, table: Any, rows: List[Dict[str, Any]]) -> None:
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(insert(table), rows[start:start + BATCH_SIZE])
@@ -1,14 +1,11 @@
 from typing import Optional
 
-from components.db import get_engine
+from components.db import session_scope
 from components.models.auth.auth_user import AuthUser
 from components.models.orm_models import AuthUserTbl
 from components.utils.exceptions import UsernameExistsError
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
-
-_engine = get_engine()
 
 def get_user_by_username(username: str) -> Optional[AuthUser]:
     """
@@ -18,10 +15,9 @@ def get_user_by_username(username: str) -> Optional[AuthUser]:
     :return AuthUser if exists, else None
     """
     try:
-        with _engine.connect() as connection:
+        with session_scope(read_only=True) as session:
             stmt = select(AuthUserTbl).where(AuthUserTbl.username == username)
-            result = connection.execute(stmt)
-            user = result.first()
+            user = session.scalars(stmt).first()
             return AuthUser(
                 user_id=user.user_id,
                 username=user.username,
@@ -44,9 +40,8 @@ def create_user(user_id: int, username: str, hashed_password: str) -> None:
             username=username,
             hashed_password=hashed_password
         )
-        with Session(_engine) as session:
+        with session_scope() as session:
             session.add(user)
-            session.commit()
     except IntegrityError:
         raise UsernameExistsError(f"Cannot create user, username {username} already exists")
     except Exception as e:
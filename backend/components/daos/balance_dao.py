@@ -0,0 +1,103 @@
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import List
+
+from components.db import session_scope
+from components.models.balance import MemberBalance
+from components.models.orm_models import (ExpenseGroupBalanceTbl,
+                                          ExpenseGroupMembersTbl)
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.orm import Session
+
+# balances are kept in whole cents
+BALANCE_UNIT = Decimal("0.01")
+
+
+def get_balances(group_id: int) -> List[MemberBalance]:
+    """
+    Gets the running balance of every member of a group
+
+    :param group_id: id of group
+    :return balances ordered by user id
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        with session_scope(read_only=True) as session:
+            stmt = (
+                select(ExpenseGroupBalanceTbl.user_id, ExpenseGroupBalanceTbl.balance)
+                .where(ExpenseGroupBalanceTbl.group_id == group_id)
+                .order_by(ExpenseGroupBalanceTbl.user_id)
+            )
+            return [
+                MemberBalance(user_id=user_id, balance=float(balance))
+                for user_id, balance in session.execute(stmt)
+            ]
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving balances from the db: {e}")
+
+
+def open_balances(session: Session, group_id: int, user_ids: List[int]) -> None:
+    """
+    Starts a zero balance for members joining a group, within the caller's transaction
+
+    :param session: session the membership change is being made in
+    :param group_id: id of group
+    :param user_ids: ids of users joining the group
+    """
+    if user_ids:
+        session.execute(
+            insert(ExpenseGroupBalanceTbl).values([
+                {"group_id": group_id, "user_id": user_id, "balance": 0}
+                for user_id in user_ids
+            ])
+        )
+
+
+def apply_expense(session: Session, group_id: int, author_id: int, expense_date: datetime, *amounts: float) -> None:
+    """
+    Applies expenses made together by one author to a group's balances within the caller's transaction.
+    Each amount is split evenly between everyone who was a member when the expenses were made and every
+    share is rounded to the cent. The author is credited what the shares add up to, so they absorb the
+    rounding residual and the group's balances always sum to zero. Pass negative amounts to reverse expenses
+
+    :param session: session the expense change is being made in
+    :param group_id: id of group the expenses belong to
+    :param author_id: id of user who paid
+    :param expense_date: date of the expenses
+    :param amounts: amounts to apply
+    """
+    if not any(amounts):
+        return
+    participated = and_(
+        ExpenseGroupMembersTbl.c.group_id == group_id,
+        ExpenseGroupMembersTbl.c.joined_date <= expense_date,
+    )
+    participant_count = session.scalar(select(func.count()).select_from(ExpenseGroupMembersTbl).where(participated))
+    if not participant_count:
+        return
+    # rounding half away from zero keeps a reversed expense's shares equal and opposite to the original's
+    share = sum(
+        ((Decimal(str(amount)) / participant_count).quantize(BALANCE_UNIT, rounding=ROUND_HALF_UP) for amount in amounts),
+        Decimal(0),
+    )
+    if share == 0:
+        return
+    participants = select(ExpenseGroupMembersTbl.c.user_id).where(participated)
+    session.execute(
+        update(ExpenseGroupBalanceTbl)
+        .where(
+            ExpenseGroupBalanceTbl.group_id == group_id,
+            ExpenseGroupBalanceTbl.user_id.in_(participants),
+        )
+        .values(balance=ExpenseGroupBalanceTbl.balance - share)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        update(ExpenseGroupBalanceTbl)
+        .where(
+            ExpenseGroupBalanceTbl.group_id == group_id,
+            ExpenseGroupBalanceTbl.user_id == author_id,
+        )
+        .values(balance=ExpenseGroupBalanceTbl.balance + share * participant_count)
+        .execution_options(synchronize_session=False)
+    )
@@ -1,51 +1,230 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import (Any, AsyncIterator, Dict, Iterator, List, NoReturn,
+                    Optional)
 
-from components.db import get_engine
+from components.daos import balance_dao, expense_group_dao, predicates
+from components.db import (get_async_read_engine, get_read_engine,
+                           session_scope)
 from components.models.expense import Expense
-from components.models.orm_models import ExpenseTbl
-from components.utils.exceptions import DoesNotExistError
-from sqlalchemy import and_, delete, select, update
+from components.models.expense_changes import ExpenseChanges
+from components.models.expense_import import ExpenseCreate
+from components.models.expense_summary import (ExpenseSummary, MemberSpending,
+                                               PeriodSpending, SummaryBucket)
+from components.models.orm_models import (ExpenseGroupTbl, ExpenseTbl,
+                                          ExpenseTombstoneTbl)
+from components.utils.exceptions import DoesNotExistError, UnauthorizedError
+from components.utils.pagination import decode_cursor, encode_cursor
+from sqlalchemy import (ColumnElement, Row, Select, and_, delete, extract, func,
+                        insert, or_, select, update)
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-_engine = get_engine()
+STREAM_BATCH_SIZE = 1000
+INSERT_BATCH_SIZE = 500
 
+# listings select just the columns of the Expense model, rows are encoded without building a model per row
+_EXPENSE_COLUMNS = (
+    ExpenseTbl.id,
+    ExpenseTbl.title,
+    ExpenseTbl.description,
+    ExpenseTbl.price,
+    ExpenseTbl.date,
+    ExpenseTbl.author_id,
+)
 
-def get_expenses_by_group(group_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> List[Expense]:
+
+def get_expenses_by_group(group_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Gets expenses for a given group
+    Gets expenses for a given group ordered by date then id
 
     :param group_id: id of group to get expenses for
     :param created_before: only return expenses created before this date
     :param created_after: only return expenses created after this date
-    :return list of expenses
+    :param limit: maximum number of expenses to return
+    :param cursor: only return expenses after the one this cursor was created from
+    :return list of expense rows shaped like Expense
+    :except InvalidCursorError if the cursor is malformed
     :except Exception if an error occurs communicating with the db
     """
+    stmt = _expenses_by_group_stmt(group_id, created_before, created_after, cursor)
+    if limit is not None:
+        stmt = stmt.limit(limit)
     try:
-        with Session(_engine) as session:
-            stmt = select(ExpenseTbl).where(ExpenseTbl.group_id == group_id)
-            if created_before is not None:
-                stmt = stmt.where(ExpenseTbl.date < created_before)
-            if created_after is not None:
-                stmt = stmt.where(ExpenseTbl.date > created_after)
-            stmt_ordered = stmt.order_by(ExpenseTbl.date)
-            expenses = session.scalars(stmt_ordered).all()
-            return [
-                Expense(
-                    id=expense.id,
-                    title=expense.title,
-                    description=expense.description,
-                    price=expense.price,
-                    date=expense.date,
-                    author_id=expense.author_id,
-                )
-                for expense in expenses
-            ]
+        with session_scope(read_only=True) as session:
+            return [dict(row) for row in session.execute(stmt).mappings()]
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
+def stream_expenses_by_group(group_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams expenses for a given group ordered by date then id without loading them all into memory. The
+    mysql connector buffers whole result sets, so rows are read in keyset pages of STREAM_BATCH_SIZE, each
+    on a connection held only while the page is fetched
+
+    :param group_id: id of group to get expenses for
+    :param created_before: only return expenses created before this date
+    :param created_after: only return expenses created after this date
+    :return iterator over expense rows shaped like Expense
+    :except Exception if an error occurs communicating with the db
+    """
+    cursor = None
+    while True:
+        stmt = _expenses_by_group_stmt(group_id, created_before, created_after, cursor).limit(STREAM_BATCH_SIZE)
+        try:
+            with Session(get_read_engine()) as session:
+                rows = [dict(row) for row in session.execute(stmt).mappings()]
+        except Exception as e:
+            raise Exception(f"An error occurred retrieving expenses from the db: {e}")
+        yield from rows
+        if len(rows) < STREAM_BATCH_SIZE:
+            return
+        cursor = encode_cursor(rows[-1]["date"], rows[-1]["id"])
+
+
+async def get_expenses_by_group_async(group_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Gets expenses for a given group ordered by date then id on the async engine
+
+    :param group_id: id of group to get expenses for
+    :param created_before: only return expenses created before this date
+    :param created_after: only return expenses created after this date
+    :param limit: maximum number of expenses to return
+    :param cursor: only return expenses after the one this cursor was created from
+    :return list of expense rows shaped like Expense
+    :except InvalidCursorError if the cursor is malformed
+    :except Exception if an error occurs communicating with the db
+    """
+    stmt = _expenses_by_group_stmt(group_id, created_before, created_after, cursor)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            result = await session.execute(stmt)
+            return [dict(row) for row in result.mappings()]
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving expenses from the db: {e}")
+
+
+async def stream_expenses_by_group_async(group_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams expenses for a given group ordered by date then id on the async engine
+
+    :param group_id: id of group to get expenses for
+    :param created_before: only return expenses created before this date
+    :param created_after: only return expenses created after this date
+    :return async iterator over expense rows shaped like Expense
+    :except Exception if an error occurs communicating with the db
+    """
+    stmt = _expenses_by_group_stmt(group_id, created_before, created_after).execution_options(yield_per=STREAM_BATCH_SIZE)
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            async for row in (await session.stream(stmt)).mappings():
+                yield dict(row)
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving expenses from the db: {e}")
+
+
+def get_expense_changes(group_id: int, since: Optional[int] = None) -> ExpenseChanges:
+    """
+    Gets the expenses of a group created, edited or deleted after a watermark. Both reads share one
+    transaction and are bounded by the group version read first, so every change up to the returned
+    watermark is included exactly when it has committed
+
+    :param group_id: id of group to get changes for
+    :param since: watermark returned by a previous call, None to get every expense
+    :return changed expenses ordered by the version that changed them, ids of deleted expenses and the new watermark
+    :except DoesNotExistError if the group does not exist
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        with session_scope(read_only=True) as session:
+            watermark = session.scalar(select(ExpenseGroupTbl.version).where(ExpenseGroupTbl.id == group_id))
+            if watermark is None:
+                raise DoesNotExistError(f"Group with id {group_id} does not exist")
+            changed_stmt = (
+                select(ExpenseTbl)
+                .where(ExpenseTbl.group_id == group_id, ExpenseTbl.version <= watermark)
+                .order_by(ExpenseTbl.version, ExpenseTbl.id)
+            )
+            deleted: List[int] = []
+            if since is not None:
+                changed_stmt = changed_stmt.where(ExpenseTbl.version > since)
+                deleted_stmt = (
+                    select(ExpenseTombstoneTbl.expense_id)
+                    .where(
+                        ExpenseTombstoneTbl.group_id == group_id,
+                        ExpenseTombstoneTbl.version > since,
+                        ExpenseTombstoneTbl.version <= watermark,
+                    )
+                    .order_by(ExpenseTombstoneTbl.version)
+                )
+                deleted = list(session.scalars(deleted_stmt))
+            return ExpenseChanges(
+                watermark=watermark,
+                changed=[_to_expense(expense) for expense in session.scalars(changed_stmt)],
+                deleted=deleted,
+            )
+    except DoesNotExistError:
+        raise
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving expense changes from the db: {e}")
+
+
+def get_expense_summary(group_id: int, bucket: SummaryBucket = SummaryBucket.month, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> ExpenseSummary:
+    """
+    Gets spending totals for a given group, aggregated per member and per time period by the db
+
+    :param group_id: id of group to summarize
+    :param bucket: time period to group expenses into
+    :param created_before: only include expenses created before this date
+    :param created_after: only include expenses created after this date
+    :return expense summary
+    :except Exception if an error occurs communicating with the db
+    """
+    criteria = [ExpenseTbl.group_id == group_id]
+    if created_before is not None:
+        criteria.append(ExpenseTbl.date < created_before)
+    if created_after is not None:
+        criteria.append(ExpenseTbl.date > created_after)
+    period_columns = [extract("year", ExpenseTbl.date)]
+    if bucket in (SummaryBucket.month, SummaryBucket.day):
+        period_columns.append(extract("month", ExpenseTbl.date))
+    if bucket == SummaryBucket.day:
+        period_columns.append(extract("day", ExpenseTbl.date))
+    try:
+        with session_scope(read_only=True) as session:
+            member_rows = session.execute(
+                select(ExpenseTbl.author_id, func.sum(ExpenseTbl.price), func.count(ExpenseTbl.id))
+                .where(*criteria)
+                .group_by(ExpenseTbl.author_id)
+                .order_by(ExpenseTbl.author_id)
+            ).all()
+            period_rows = session.execute(
+                select(*period_columns, func.sum(ExpenseTbl.price), func.count(ExpenseTbl.id))
+                .where(*criteria)
+                .group_by(*period_columns)
+                .order_by(*period_columns)
+            ).all()
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving an expense summary from the db: {e}")
+    by_member = [
+        MemberSpending(author_id=author_id, total=total, count=count)
+        for author_id, total, count in member_rows
+    ]
+    by_period = [
+        PeriodSpending(period_start=_period_start(*parts), total=total, count=count)
+        for *parts, total, count in period_rows
+    ]
+    return ExpenseSummary(
+        total=sum(member.total for member in by_member),
+        count=sum(member.count for member in by_member),
+        by_member=by_member,
+        by_period=by_period,
+    )
+
+
 def create_expense(author_id: int, title: str, price: float, group_id: int, description: Optional[str] = None) -> int:
     """
     Creates an expense
@@ -60,19 +239,23 @@ def create_expense(author_id: int, title: str, price: float, group_id: int, desc
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
+        with session_scope() as session:
+            version = expense_group_dao.touch_group(session, group_id)
+            now = datetime.utcnow()
             expense = ExpenseTbl(
                 title=title,
                 description=description,
                 price=price,
-                date=datetime.utcnow(),
+                date=now,
                 author_id=author_id,
                 group_id=group_id,
+                version=version,
+                updated_date=now,
             )
             session.add(expense)
             session.flush()
             session.refresh(expense)
-            session.commit()
+            balance_dao.apply_expense(session, group_id, author_id, expense.date, price)
             return expense.id
     except IntegrityError:
         raise DoesNotExistError("Author or group does not exist")
@@ -80,18 +263,62 @@ def create_expense(author_id: int, title: str, price: float, group_id: int, desc
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
-def update_expense(id: int, title: Optional[str] = None, price: Optional[float] = None, description: Optional[str] = None) -> bool:
+def bulk_create_expenses(author_id: int, group_id: int, expenses: List[ExpenseCreate]) -> int:
+    """
+    Creates many expenses in a single transaction using multi-row inserts
+
+    :param author_id: id of user creating the expenses
+    :param group_id: id of group to tie the expenses to
+    :param expenses: expenses to create
+    :return number of expenses created
+    :except DoesNotExistError if the user or group reference does not exist
+    :except Exception if an error occurs communicating with the db
+    """
+    if not expenses:
+        return 0
+    now = datetime.utcnow()
+    try:
+        with session_scope() as session:
+            version = expense_group_dao.touch_group(session, group_id)
+            for start in range(0, len(expenses), INSERT_BATCH_SIZE):
+                stmt = insert(ExpenseTbl).values([
+                    {
+                        "title": expense.title,
+                        "description": expense.description,
+                        "price": expense.price,
+                        "date": now,
+                        "author_id": author_id,
+                        "group_id": group_id,
+                        "version": version,
+                        "updated_date": now,
+                    }
+                    for expense in expenses[start:start + INSERT_BATCH_SIZE]
+                ])
+                session.execute(stmt)
+            # every row shares an author and date, so the balances are updated once for all of them
+            balance_dao.apply_expense(session, group_id, author_id, now, *(expense.price for expense in expenses))
+            return len(expenses)
+    except IntegrityError:
+        raise DoesNotExistError("Author or group does not exist")
+    except Exception as e:
+        raise Exception(f"An error occurred creating expenses in the db: {e}")
+
+
+def update_expense(id: int, author_id: int, title: Optional[str] = None, price: Optional[float] = None, description: Optional[str] = None) -> bool:
     """
-    Updates an expense
+    Updates an expense, provided it was created by the given author
 
     :param id: id of expense being updated
+    :param author_id: id of user who must have created the expense
     :param title: updated title
     :param price: updated price
     :param description: updated description
     :return True if the expense was updated
+    :except DoesNotExistError if the expense does not exist
+    :except UnauthorizedError if the expense was created by another user
     :except Exception if an error occurs communicating with the db
     """
-    update_values = {}
+    update_values: Dict[str, Any] = {}
     if title is not None:
         update_values["title"] = title
     if price is not None:
@@ -99,51 +326,125 @@ def update_expense(id: int, title: Optional[str] = None, price: Optional[float]
     if description is not None:
         update_values["description"] = description
     try:
-        with Session(_engine) as session:
-            stmt = update(ExpenseTbl).where(ExpenseTbl.id == id).values(update_values)
+        with session_scope() as session:
+            update_values["version"] = expense_group_dao.touch_group(session, _group_id_of(id))
+            update_values["updated_date"] = datetime.utcnow()
+            if price is not None:
+                expense = _lock_expense(session, id, author_id)
+                if expense is None:
+                    _raise_not_authored(session, id)
+                balance_dao.apply_expense(session, expense.group_id, expense.author_id, expense.date, -expense.price, price)
+            stmt = (
+                update(ExpenseTbl)
+                .where(ExpenseTbl.id == id, ExpenseTbl.author_id == author_id)
+                .values(update_values)
+            )
             result = session.execute(stmt)
-            session.commit()
-            return result.rowcount > 0
+            if result.rowcount == 0:
+                _raise_not_authored(session, id)
+            return True
+    except (DoesNotExistError, UnauthorizedError):
+        raise
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
-def delete_expense(id: int) -> bool:
+def delete_expense(id: int, author_id: int) -> bool:
     """
-    Deletes an expense
+    Deletes an expense, provided it was created by the given author, leaving a tombstone for delta syncs
 
     :param id: id of expense to delete
+    :param author_id: id of user who must have created the expense
     :return True if expense was deleted
+    :except DoesNotExistError if the expense does not exist
+    :except UnauthorizedError if the expense was created by another user
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
-            stmt = delete(ExpenseTbl).where(ExpenseTbl.id == id)
-            result = session.execute(stmt)
-            session.commit()
-            return result.rowcount > 0
+        with session_scope() as session:
+            version = expense_group_dao.touch_group(session, _group_id_of(id))
+            expense = _lock_expense(session, id, author_id)
+            if expense is None:
+                _raise_not_authored(session, id)
+            balance_dao.apply_expense(session, expense.group_id, expense.author_id, expense.date, -expense.price)
+            session.execute(
+                insert(ExpenseTombstoneTbl).values(
+                    expense_id=id,
+                    group_id=expense.group_id,
+                    version=version,
+                    deleted_date=datetime.utcnow(),
+                )
+            )
+            stmt = delete(ExpenseTbl).where(ExpenseTbl.id == id, ExpenseTbl.author_id == author_id)
+            session.execute(stmt)
+            return True
+    except (DoesNotExistError, UnauthorizedError):
+        raise
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
-def user_is_author(user_id: int, expense_id: int) -> bool:
+def _expenses_by_group_stmt(group_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, cursor: Optional[str] = None) -> Select:
     """
-    Determines if a given user is the author of an expense
+    Builds the keyset ordered query for a group's expenses
 
-    :param user_id: user
-    :param expense_id: expense
-    :return true if the user created the expense
-    :except Exception if an error occurs communicating with the db
+    :except InvalidCursorError if the cursor is malformed
     """
-    try:
-        with Session(_engine) as session:
-            stmt = select(ExpenseTbl).where(
-                and_(
-                    ExpenseTbl.id == expense_id,
-                    ExpenseTbl.author_id == user_id
-                )
+    stmt = select(*_EXPENSE_COLUMNS).where(ExpenseTbl.group_id == group_id)
+    if created_before is not None:
+        stmt = stmt.where(ExpenseTbl.date < created_before)
+    if created_after is not None:
+        stmt = stmt.where(ExpenseTbl.date > created_after)
+    if cursor is not None:
+        cursor_date, cursor_id = decode_cursor(cursor, datetime, int)
+        stmt = stmt.where(
+            or_(
+                ExpenseTbl.date > cursor_date,
+                and_(ExpenseTbl.date == cursor_date, ExpenseTbl.id > cursor_id),
             )
-            result = session.scalars(stmt).all()
-            return len(result) > 0
-    except Exception as e:
-        raise Exception(f"An error occurred retrieving a user from the db: {e}")
+        )
+    return stmt.order_by(ExpenseTbl.date, ExpenseTbl.id)
+
+
+def _group_id_of(id: int) -> ColumnElement[int]:
+    return select(ExpenseTbl.group_id).where(ExpenseTbl.id == id).scalar_subquery()
+
+
+def _lock_expense(session: Session, id: int, author_id: int) -> Optional[Row]:
+    """
+    Reads the ledger relevant columns of an expense created by the given author, locking its row until
+    the transaction ends
+    """
+    stmt = (
+        select(ExpenseTbl.group_id, ExpenseTbl.author_id, ExpenseTbl.date, ExpenseTbl.price)
+        .where(ExpenseTbl.id == id, ExpenseTbl.author_id == author_id)
+        .with_for_update()
+    )
+    return session.execute(stmt).first()
+
+
+def _raise_not_authored(session: Session, id: int) -> NoReturn:
+    """
+    Explains why an author scoped statement matched no expense, only consulted on the failure path
+
+    :except DoesNotExistError if the expense does not exist
+    :except UnauthorizedError if the expense was created by another user
+    """
+    if not session.scalar(predicates.expense_exists(id)):
+        raise DoesNotExistError(f"Expense with id {id} does not exist")
+    raise UnauthorizedError("User did not create an expense with the provided id")
+
+
+def _period_start(year: int, month: int = 1, day: int = 1) -> date:
+    return date(int(year), int(month), int(day))
+
+
+def _to_expense(expense: ExpenseTbl) -> Expense:
+    return Expense(
+        id=expense.id,
+        title=expense.title,
+        description=expense.description,
+        price=expense.price,
+        date=expense.date,
+        author_id=expense.author_id,
+    )
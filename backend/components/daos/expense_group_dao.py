@@ -1,48 +1,32 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional, Union
 
-from components.db import get_engine
+from components.daos import balance_dao
+from components.db import (get_async_engine, get_async_read_engine,
+                           session_scope)
 from components.models.expense_group import ExpenseGroup
+from components.models.group_version import GroupVersion
 from components.models.orm_models import (ExpenseGroupMembersTbl,
                                           ExpenseGroupTbl, UserTbl)
 from components.models.user import User
 from components.utils.exceptions import DoesNotExistError
-from sqlalchemy import and_, insert, select
+from sqlalchemy import (ColumnElement, Row, Select, and_, func, insert, select,
+                        update)
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
-_engine = get_engine()
-
-def get_groups(user_id: int) -> List[ExpenseGroup]:
+def get_groups(user_id: int) -> List[Dict[str, Any]]:
     """
     Gets all expense groups for a given user
 
     :param user_id: id of user to get the groups for
+    :return list of group rows shaped like ExpenseGroup
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
-            groups = (
-                session
-                .query(ExpenseGroupTbl)
-                .join(ExpenseGroupMembersTbl)
-                .filter(ExpenseGroupMembersTbl.c.user_id == user_id)
-            )
-            return [
-                ExpenseGroup(
-                    id=group.id,
-                    name=group.name,
-                    created_date=group.created_date,
-                    author=User(
-                        id=group.author.id,
-                        username=group.author.username,
-                        first_name=group.author.first_name,
-                        last_name=group.author.last_name,
-                        email=group.author.email,
-                    )
-                )
-                for group in groups
-            ]
+        with session_scope(read_only=True) as session:
+            return [_to_group_row(row) for row in session.execute(_groups_stmt(user_id))]
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
@@ -56,27 +40,17 @@ def get_group(group_id: int) -> Optional[ExpenseGroup]:
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
+        with session_scope(read_only=True) as session:
             group = (
                 session
                 .query(ExpenseGroupTbl)
+                .options(joinedload(ExpenseGroupTbl.author, innerjoin=True))
                 .filter(ExpenseGroupTbl.id == group_id)
                 .first()
             )
-            return ExpenseGroup(
-                id=group.id,
-                name=group.name,
-                created_date=group.created_date,
-                author=User(
-                    id=group.author.id,
-                    username=group.author.username,
-                    first_name=group.author.first_name,
-                    last_name=group.author.last_name,
-                    email=group.author.email,
-                )
-            ) if group is not None else None
+            return _to_expense_group(group) if group is not None else None
     except Exception as e:
-        raise Exception(f"An error occurred retrieving a user from the db: {e}")
+        raise Exception(f"An error occurred retrieving a group from the db: {e}")
 
 
 def create_group(author_id: int, name: str, members: List[int] = []) -> int:
@@ -91,66 +65,308 @@ def create_group(author_id: int, name: str, members: List[int] = []) -> int:
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
+        with session_scope() as session:
+            created_date = datetime.utcnow()
             group = ExpenseGroupTbl(
                 name=name,
                 author_id=author_id,
-                created_date=datetime.utcnow(),
+                created_date=created_date,
+                modified_date=created_date,
             )
             session.add(group)
             session.flush()
-            session.refresh(group)
-            for id in [author_id, *members]:
-                stmt = insert(ExpenseGroupMembersTbl).values(
-                    group_id=group.id,
-                    user_id=id,
-                )
-                session.execute(stmt)
-            session.commit()
-            return group.id
+            group_id = group.id
+            member_ids = list(dict.fromkeys([author_id, *members]))
+            stmt = insert(ExpenseGroupMembersTbl).values([
+                {"group_id": group_id, "user_id": id, "joined_date": group.created_date}
+                for id in member_ids
+            ])
+            session.execute(stmt)
+            balance_dao.open_balances(session, group_id, member_ids)
+            return group_id
     except IntegrityError:
         raise DoesNotExistError(f"One or more expense group members do not exist")
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
-def add_member(group_id: int, user_id: int) -> bool:
+def add_members(group_id: int, user_ids: List[int]) -> bool:
     """
-    Adds a member to a group
+    Adds members to a group with a single multi-row insert
 
-    :param group_id: id of group the member is being added to
-    :param user_id: id of user being added to the group
+    :param group_id: id of group the members are being added to
+    :param user_ids: ids of users being added to the group
+    :except DoesNotExistError if a user reference does not exist
     :except Exception if an error occurs communicating with the db
     """
+    if not user_ids:
+        return False
     try:
-        with Session(_engine) as session:
-            stmt = insert(ExpenseGroupMembersTbl).values(
-                group_id=group_id,
-                user_id=user_id,
-            )
+        with session_scope() as session:
+            touch_group(session, group_id)
+            joined_date = datetime.utcnow()
+            stmt = insert(ExpenseGroupMembersTbl).values([
+                {"group_id": group_id, "user_id": user_id, "joined_date": joined_date}
+                for user_id in user_ids
+            ])
             session.execute(stmt)
-            session.commit()
+            balance_dao.open_balances(session, group_id, user_ids)
             return True
+    except IntegrityError:
+        raise DoesNotExistError("One or more users do not exist or are already members")
     except Exception as e:
-        raise Exception(f"An error occurred retrieving a user from the db: {e}")
+        raise Exception(f"An error occurred adding group members in the db: {e}")
 
 
-def user_is_member(user_id: int, group_id: int) -> bool:
+def get_members_among(group_id: int, user_ids: List[int]) -> FrozenSet[int]:
     """
-    Determines if a user is a member of a given group
+    Gets which of the given users are members of a group
 
-    :param user_id: id of user
     :param group_id: id of group
-    :return true if the user is a member of the group
+    :param user_ids: ids of users to check
+    :return ids of the users that are members
+    :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
-            stmt = select(ExpenseGroupMembersTbl).where(
+        with session_scope(read_only=True) as session:
+            stmt = select(ExpenseGroupMembersTbl.c.user_id).where(
                 and_(
-                    ExpenseGroupMembersTbl.c.user_id == user_id,
-                    ExpenseGroupMembersTbl.c.group_id == group_id
+                    ExpenseGroupMembersTbl.c.group_id == group_id,
+                    ExpenseGroupMembersTbl.c.user_id.in_(user_ids)
                 )
             )
-            return session.execute(stmt).rowcount > 0
+            return frozenset(session.scalars(stmt))
     except Exception as e:
-        raise Exception(f"An error occurred retrieving a user from the db: {e}")
+        raise Exception(f"An error occurred retrieving group members from the db: {e}")
+
+
+def touch_group(session: Session, group_id: Union[int, ColumnElement[int]]) -> Optional[int]:
+    """
+    Bumps a group's version within the caller's transaction, should be called by every change to the group's
+    expenses or members before any other row is written. The group row stays locked until the transaction
+    ends, so versions are handed out and committed in order
+
+    :param session: session the change is being made in
+    :param group_id: id of group, or a scalar subquery selecting it
+    :return new version of the group, None if it does not exist
+    """
+    session.execute(
+        update(ExpenseGroupTbl)
+        .where(ExpenseGroupTbl.id == group_id)
+        .values(version=ExpenseGroupTbl.version + 1, modified_date=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return session.scalar(select(ExpenseGroupTbl.version).where(ExpenseGroupTbl.id == group_id))
+
+
+def get_group_version(group_id: int) -> Optional[GroupVersion]:
+    """
+    Gets the version of a single group with a primary key lookup
+
+    :param group_id: id of group
+    :return version of the group if it exists else none
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        with session_scope(read_only=True) as session:
+            row = session.execute(_group_version_stmt(group_id)).first()
+            return _to_group_version(group_id, row) if row is not None else None
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving a group version from the db: {e}")
+
+
+def get_groups_version(user_id: int) -> GroupVersion:
+    """
+    Gets a combined version of every group a user is a member of, changes whenever one of the groups changes
+    or the user joins another group
+
+    :param user_id: id of user
+    :return combined version of the user's groups
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        with session_scope(read_only=True) as session:
+            return _to_groups_version(session.execute(_groups_version_stmt(user_id)).one())
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving a group version from the db: {e}")
+
+
+def get_group_ids_for_user(user_id: int) -> FrozenSet[int]:
+    """
+    Gets the ids of every group a user is a member of. Memberships are cached across requests, so they are
+    read from the primary rather than a replica that may not have seen the user join yet
+
+    :param user_id: id of user
+    :return ids of groups the user belongs to
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        with session_scope(read_only=True, allow_replica=False) as session:
+            stmt = _group_ids_for_user_stmt(user_id)
+            return frozenset(session.scalars(stmt))
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving group memberships from the db: {e}")
+
+
+async def get_groups_async(user_id: int) -> List[Dict[str, Any]]:
+    """
+    Gets all expense groups for a given user on the async engine
+
+    :param user_id: id of user to get the groups for
+    :return list of group rows shaped like ExpenseGroup
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            return [_to_group_row(row) for row in await session.execute(_groups_stmt(user_id))]
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving groups from the db: {e}")
+
+
+async def get_group_async(group_id: int) -> Optional[ExpenseGroup]:
+    """
+    Gets an expense group by id on the async engine
+
+    :param group_id: id of group
+    :return group if it exists else none
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            stmt = (
+                select(ExpenseGroupTbl)
+                .options(joinedload(ExpenseGroupTbl.author, innerjoin=True))
+                .where(ExpenseGroupTbl.id == group_id)
+            )
+            group = (await session.scalars(stmt)).first()
+            return _to_expense_group(group) if group is not None else None
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving a group from the db: {e}")
+
+
+async def get_group_ids_for_user_async(user_id: int) -> FrozenSet[int]:
+    """
+    Gets the ids of every group a user is a member of on the primary's async engine, see get_group_ids_for_user
+
+    :param user_id: id of user
+    :return ids of groups the user belongs to
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        async with AsyncSession(get_async_engine()) as session:
+            stmt = _group_ids_for_user_stmt(user_id)
+            return frozenset(await session.scalars(stmt))
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving group memberships from the db: {e}")
+
+
+async def get_group_version_async(group_id: int) -> Optional[GroupVersion]:
+    """
+    Gets the version of a single group on the async engine
+
+    :param group_id: id of group
+    :return version of the group if it exists else none
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            row = (await session.execute(_group_version_stmt(group_id))).first()
+            return _to_group_version(group_id, row) if row is not None else None
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving a group version from the db: {e}")
+
+
+async def get_groups_version_async(user_id: int) -> GroupVersion:
+    """
+    Gets a combined version of every group a user is a member of on the async engine
+
+    :param user_id: id of user
+    :return combined version of the user's groups
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            return _to_groups_version((await session.execute(_groups_version_stmt(user_id))).one())
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving a group version from the db: {e}")
+
+
+def _groups_stmt(user_id: int) -> Select:
+    return (
+        select(
+            ExpenseGroupTbl.id,
+            ExpenseGroupTbl.name,
+            ExpenseGroupTbl.created_date,
+            UserTbl.id,
+            UserTbl.username,
+            UserTbl.first_name,
+            UserTbl.last_name,
+            UserTbl.email,
+        )
+        .join(UserTbl, UserTbl.id == ExpenseGroupTbl.author_id)
+        .join(ExpenseGroupMembersTbl, ExpenseGroupMembersTbl.c.group_id == ExpenseGroupTbl.id)
+        .where(ExpenseGroupMembersTbl.c.user_id == user_id)
+    )
+
+
+def _group_ids_for_user_stmt(user_id: int) -> Select:
+    return select(ExpenseGroupMembersTbl.c.group_id).where(ExpenseGroupMembersTbl.c.user_id == user_id)
+
+
+def _group_version_stmt(group_id: int) -> Select:
+    return select(ExpenseGroupTbl.version, ExpenseGroupTbl.modified_date).where(ExpenseGroupTbl.id == group_id)
+
+
+def _groups_version_stmt(user_id: int) -> Select:
+    return (
+        select(
+            func.count(),
+            func.max(ExpenseGroupTbl.id),
+            func.coalesce(func.sum(ExpenseGroupTbl.version), 0),
+            func.max(ExpenseGroupTbl.modified_date),
+        )
+        .select_from(ExpenseGroupTbl)
+        .join(ExpenseGroupMembersTbl)
+        .where(ExpenseGroupMembersTbl.c.user_id == user_id)
+    )
+
+
+def _to_group_version(group_id: int, row: Row) -> GroupVersion:
+    version, modified_date = row
+    return GroupVersion(tag=f"{group_id}.{version}", modified_date=modified_date)
+
+
+def _to_groups_version(row: Row) -> GroupVersion:
+    count, max_id, version_sum, modified_date = row
+    return GroupVersion(tag=f"{count}.{max_id or 0}.{version_sum}", modified_date=modified_date)
+
+
+def _to_group_row(row: Row) -> Dict[str, Any]:
+    id, name, created_date, author_id, username, first_name, last_name, email = row
+    return {
+        "id": id,
+        "name": name,
+        "created_date": created_date,
+        "author": {
+            "id": author_id,
+            "username": username,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+        },
+    }
+
+
+def _to_expense_group(group: ExpenseGroupTbl) -> ExpenseGroup:
+    return ExpenseGroup(
+        id=group.id,
+        name=group.name,
+        created_date=group.created_date,
+        author=User(
+            id=group.author.id,
+            username=group.author.username,
+            first_name=group.author.first_name,
+            last_name=group.author.last_name,
+            email=group.author.email,
+        )
+    )
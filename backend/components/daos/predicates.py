@@ -0,0 +1,16 @@
+from components.models.orm_models import ExpenseTbl
+from sqlalchemy import ColumnElement, Select, exists, select
+
+
+def expense_exists(expense_id: int) -> Select:
+    """
+    Builds a query for whether an expense exists
+
+    :param expense_id: id of expense
+    :return SELECT EXISTS query
+    """
+    return _exists(ExpenseTbl.id == expense_id)
+
+
+def _exists(criteria: ColumnElement[bool]) -> Select:
+    return select(exists().where(criteria))
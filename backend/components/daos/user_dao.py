@@ -1,86 +1,67 @@
-from typing import List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional
 
-from components.db import get_engine
-from components.models.orm_models import ExpenseGroupMembersTbl, UserTbl
+from components.db import get_async_read_engine, session_scope
+from components.models.orm_models import (AuthUserTbl, ExpenseGroupMembersTbl,
+                                          UserTbl)
 from components.models.user import User
 from components.utils.exceptions import UsernameExistsError
-from sqlalchemy import select
+from components.utils.pagination import decode_cursor
+from sqlalchemy import Select, or_, select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-_engine = get_engine()
+# listings select just the columns of the User model, rows are encoded without building a model per row
+_USER_COLUMNS = (UserTbl.id, UserTbl.username, UserTbl.first_name, UserTbl.last_name, UserTbl.email)
 
-def get_users() -> List[User]:
+
+def get_users(limit: Optional[int] = None, cursor: Optional[str] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Gets all users
+    Gets users ordered by id
 
-    :return list of users
+    :param limit: maximum number of users to return
+    :param cursor: only return users after the one this cursor was created from
+    :param search: only return users whose username, first name or last name starts with this prefix
+    :return list of user rows shaped like User
+    :except InvalidCursorError if the cursor is malformed
     """
+    stmt = _users_stmt(limit, cursor, search)
     try:
-        with Session(_engine) as session:
-            stmt = select(UserTbl)
-            result = session.scalars(stmt).all()
-            return [
-                User(
-                    id=user.id,
-                    username=user.username,
-                    first_name=user.first_name,
-                    last_name=user.last_name,
-                    email=user.email,
-                ) for user in result
-            ]
+        with session_scope(read_only=True) as session:
+            return [dict(row) for row in session.execute(stmt).mappings()]
     except Exception as e:
         raise Exception(f"An error occurred retrieving users from the db: {e}")
 
-def get_user_by_id(id: int) -> Optional[User]:
+def get_user_by_username(username: str) -> Optional[User]:
     """
-    Gets a user with a given id
+    Gets the user tied to an auth username in a single query joining the auth user and user tables
 
-    :param username: username associated with the user
+    :param username: username the user authenticates with
     :return User if exists, else None
     """
     try:
-        with _engine.connect() as connection:
-            stmt = select(UserTbl).where(UserTbl.id == id)
-            result = connection.execute(stmt)
-            user = result.first()
-            return User(
-                id=user.id,
-                username=user.username,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                email=user.email,
-            ) if user else None
+        with session_scope(read_only=True) as session:
+            stmt = (
+                select(UserTbl)
+                .join(AuthUserTbl, AuthUserTbl.user_id == UserTbl.id)
+                .where(AuthUserTbl.username == username)
+            )
+            user = session.scalars(stmt).first()
+            return _to_user(user) if user else None
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
-def get_group_members(group_id: int) -> List[User]:
+def get_group_members(group_id: int) -> List[Dict[str, Any]]:
     """
     Gets all members for a given group. If the user tries to query a group they don't belong to, throw an error
 
     :param group_id: id of group to get members for
-    :return list of users who are members of the group
+    :return list of user rows shaped like User for the members of the group
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
-            users = (
-                session
-                .query(UserTbl)
-                .join(ExpenseGroupMembersTbl)
-                .filter(ExpenseGroupMembersTbl.c.group_id == group_id)
-            )
-            return [
-                User(
-                    id=user.id,
-                    username=user.username,
-                    first_name=user.first_name,
-                    last_name=user.last_name,
-                    email=user.email
-                )
-                for user in users
-            ]
+        with session_scope(read_only=True) as session:
+            return [dict(row) for row in session.execute(_group_members_stmt(group_id)).mappings()]
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
@@ -94,7 +75,7 @@ def create_user(username: str, first_name: str, last_name: str, email: str) -> i
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
+        with session_scope() as session:
             user = UserTbl(
                 username=username,
                 first_name=first_name,
@@ -104,7 +85,6 @@ def create_user(username: str, first_name: str, last_name: str, email: str) -> i
             session.add(user)
             session.flush()
             session.refresh(user)
-            session.commit()
             return user.id
     except IntegrityError:
         raise UsernameExistsError(f"Cannot create user, username {username} already exists")
@@ -112,18 +92,115 @@ def create_user(username: str, first_name: str, last_name: str, email: str) -> i
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
 
 
-def user_exists(user_id: int) -> bool:
+def get_existing_user_ids(user_ids: List[int]) -> FrozenSet[int]:
     """
-    Determines if a user exists
+    Gets which of the given user ids exist in a single query
 
-    :param user_id: user being checked
-    :return True if the user exist
+    :param user_ids: ids of users to check
+    :return ids of the users that exist
     :except Exception if an error occurs communicating with the db
     """
     try:
-        with Session(_engine) as session:
-            stmt = select(UserTbl).where(UserTbl.id == user_id)
-            result = session.scalars(stmt).all()
-            return len(result) > 0
+        with session_scope(read_only=True) as session:
+            stmt = select(UserTbl.id).where(UserTbl.id.in_(user_ids))
+            return frozenset(session.scalars(stmt))
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving user ids from the db: {e}")
+
+
+async def get_users_async(limit: Optional[int] = None, cursor: Optional[str] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Gets users ordered by id on the async engine
+
+    :param limit: maximum number of users to return
+    :param cursor: only return users after the one this cursor was created from
+    :param search: only return users whose username, first name or last name starts with this prefix
+    :return list of user rows shaped like User
+    :except InvalidCursorError if the cursor is malformed
+    """
+    stmt = _users_stmt(limit, cursor, search)
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            result = await session.execute(stmt)
+            return [dict(row) for row in result.mappings()]
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving users from the db: {e}")
+
+
+async def get_user_by_username_async(username: str) -> Optional[User]:
+    """
+    Gets the user tied to an auth username on the async engine
+
+    :param username: username the user authenticates with
+    :return User if exists, else None
+    """
+    try:
+        async with get_async_read_engine().connect() as connection:
+            stmt = (
+                select(UserTbl)
+                .join(AuthUserTbl, AuthUserTbl.user_id == UserTbl.id)
+                .where(AuthUserTbl.username == username)
+            )
+            result = await connection.execute(stmt)
+            user = result.first()
+            return _to_user(user) if user else None
     except Exception as e:
         raise Exception(f"An error occurred retrieving a user from the db: {e}")
+
+
+async def get_group_members_async(group_id: int) -> List[Dict[str, Any]]:
+    """
+    Gets all members for a given group on the async engine
+
+    :param group_id: id of group to get members for
+    :return list of user rows shaped like User for the members of the group
+    :except Exception if an error occurs communicating with the db
+    """
+    try:
+        async with AsyncSession(get_async_read_engine()) as session:
+            result = await session.execute(_group_members_stmt(group_id))
+            return [dict(row) for row in result.mappings()]
+    except Exception as e:
+        raise Exception(f"An error occurred retrieving group members from the db: {e}")
+
+
+def _users_stmt(limit: Optional[int] = None, cursor: Optional[str] = None, search: Optional[str] = None) -> Select:
+    """
+    Builds the keyset ordered, optionally prefix filtered query for users
+
+    :except InvalidCursorError if the cursor is malformed
+    """
+    stmt = select(*_USER_COLUMNS)
+    if search:
+        stmt = stmt.where(
+            or_(
+                UserTbl.username.startswith(search, autoescape=True),
+                UserTbl.first_name.startswith(search, autoescape=True),
+                UserTbl.last_name.startswith(search, autoescape=True),
+            )
+        )
+    if cursor is not None:
+        cursor_id, = decode_cursor(cursor, int)
+        stmt = stmt.where(UserTbl.id > cursor_id)
+    stmt = stmt.order_by(UserTbl.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _group_members_stmt(group_id: int) -> Select:
+    return (
+        select(*_USER_COLUMNS)
+        .join(ExpenseGroupMembersTbl, ExpenseGroupMembersTbl.c.user_id == UserTbl.id)
+        .where(ExpenseGroupMembersTbl.c.group_id == group_id)
+    )
+
+
+def _to_user(user: UserTbl) -> User:
+    return User(
+        id=user.id,
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        email=user.email,
+    )
@@ -1,12 +1,423 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
-from components.settings import get_settings
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from components.models.pool_stats import PoolStats
+from components.settings import ReplicaConfig, get_settings
+from components.utils.request_context import RequestState, get_request_state
 
 SETTINGS = get_settings()
 
+logger = logging.getLogger(__name__)
+
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+
+
+class _WaitStats:
+    """
+    Accumulates how long callers waited to check a connection out of the pool
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, waited: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+_wait_stats = _WaitStats()
+
+
+class _WaitTimingMixin:
+    """
+    Records how long each pool checkout waited
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _wait_stats.record(time.perf_counter() - start)
+
+
+class _InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class _InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany) -> None:
+    # statements on a connection run one at a time, so a single start time per connection suffices
+    connection.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany) -> None:
+    """
+    Charges a statement to the request it ran for. Rows are the cursor's rowcount, which counts rows
+    written and, on drivers that report it, rows selected
+    """
+    elapsed = time.perf_counter() - connection.info["query_start"]
+    state = get_request_state()
+    if state is not None:
+        state.query_stats.record(max(cursor.rowcount, 0), elapsed)
+    if elapsed * 1000 >= SETTINGS.instrumentation_config.slow_statement_ms:
+        logger.warning("slow statement took %.1fms: %s", elapsed * 1000, statement)
+
+
+def _instrument(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _pool_options() -> Dict[str, Any]:
+    return dict(
+        pool_size=SETTINGS.pool_config.size,
+        max_overflow=SETTINGS.pool_config.max_overflow,
+        pool_timeout=SETTINGS.pool_config.timeout_seconds,
+        pool_recycle=SETTINGS.pool_config.recycle_seconds,
+        pool_pre_ping=SETTINGS.pool_config.pre_ping,
+    )
+
+
 def generate_connection_string() -> str:
+    if SETTINGS.db_config.url:
+        return SETTINGS.db_config.url
     return f"{SETTINGS.db_config.dialect}+{SETTINGS.db_config.driver}://{SETTINGS.db_config.username}:{SETTINGS.db_config.password}@{SETTINGS.db_config.host}:{SETTINGS.db_config.port}/{SETTINGS.db_config.database}"
 
 
-def get_engine():
-    return create_engine(generate_connection_string())
+def generate_async_connection_string() -> str:
+    if SETTINGS.db_config.async_url:
+        return SETTINGS.db_config.async_url
+    return f"{SETTINGS.db_config.dialect}+{SETTINGS.db_config.async_driver}://{SETTINGS.db_config.username}:{SETTINGS.db_config.password}@{SETTINGS.db_config.host}:{SETTINGS.db_config.port}/{SETTINGS.db_config.database}"
+
+
+def get_engine() -> Engine:
+    """
+    Gets the process-wide engine, creating it on first use
+
+    :return engine shared by every dao in the process
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    generate_connection_string(),
+                    poolclass=_InstrumentedQueuePool,
+                    **_pool_options(),
+                )
+                _instrument(_engine)
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Gets the process-wide asyncio engine used by the async request path, creating it on first use
+
+    :return async engine shared by every async dao in the process
+    """
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    generate_async_connection_string(),
+                    poolclass=_InstrumentedAsyncQueuePool,
+                    **_pool_options(),
+                )
+                _instrument(_async_engine.sync_engine)
+    return _async_engine
+
+
+class _Replica:
+    """
+    A read replica, its engines and what is known of its health. Requests only read the cached flag, a
+    background thread probes every replica with SELECT 1 once per check interval, and a replica is taken
+    out of rotation as soon as one of its connections is found disconnected
+    """
+
+    def __init__(self, config: ReplicaConfig):
+        self.config = config
+        self.healthy = True
+        self._engine: Optional[Engine] = None
+        self._async_engine: Optional[AsyncEngine] = None
+        self._probe_engine: Optional[AsyncEngine] = None
+
+    def get_engine(self) -> Engine:
+        if self._engine is None:
+            with _engine_lock:
+                if self._engine is None:
+                    engine = create_engine(self.config.url, poolclass=QueuePool, **_pool_options())
+                    _instrument(engine)
+                    event.listen(engine, "handle_error", self._on_error)
+                    self._engine = engine
+        return self._engine
+
+    def get_async_engine(self) -> AsyncEngine:
+        if self._async_engine is None:
+            with _engine_lock:
+                if self._async_engine is None:
+                    engine = create_async_engine(self.config.async_url, poolclass=AsyncAdaptedQueuePool, **_pool_options())
+                    _instrument(engine.sync_engine)
+                    event.listen(engine.sync_engine, "handle_error", self._on_error)
+                    self._async_engine = engine
+        return self._async_engine
+
+    def probe(self) -> None:
+        """
+        Checks the replica answers, on its sync engine or, for a replica with only an async url, on a fresh
+        connection in a short-lived event loop, since the pooled async engine belongs to the request loop
+        """
+        try:
+            if self.config.url:
+                with self.get_engine().connect() as connection:
+                    connection.exec_driver_sql("SELECT 1")
+            else:
+                asyncio.run(self._probe_async())
+            self.healthy = True
+        except Exception as e:
+            if self.healthy:
+                logger.warning("replica %s failed its health check: %s", self.config.url or self.config.async_url, e)
+            self.healthy = False
+
+    async def _probe_async(self) -> None:
+        if self._probe_engine is None:
+            self._probe_engine = create_async_engine(self.config.async_url, poolclass=NullPool)
+        async with self._probe_engine.connect() as connection:
+            await connection.exec_driver_sql("SELECT 1")
+
+    def dispose(self, close: bool = True) -> None:
+        if self._engine is not None:
+            self._engine.dispose(close=close)
+            self._engine = None
+
+    async def dispose_async(self) -> None:
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+            self._async_engine = None
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect:
+            self.healthy = False
+
+
+_replicas: List[_Replica] = [_Replica(config) for config in SETTINGS.db_config.replicas]
+_next_replica = itertools.count()
+_health_checker: Optional[threading.Thread] = None
+
+
+def _check_replicas() -> None:
+    while True:
+        for replica in _replicas:
+            replica.probe()
+        time.sleep(SETTINGS.db_config.replica_check_interval_seconds)
+
+
+def _start_health_checks() -> None:
+    """
+    Starts the thread probing the replicas, once per process since a forked worker does not inherit it
+    """
+    global _health_checker
+    if _health_checker is not None and _health_checker.is_alive():
+        return
+    with _engine_lock:
+        if _health_checker is None or not _health_checker.is_alive():
+            _health_checker = threading.Thread(target=_check_replicas, name="replica-health", daemon=True)
+            _health_checker.start()
+
+
+def _pick_replica(async_engine: bool = False) -> Optional[_Replica]:
+    """
+    Picks the next healthy replica in round-robin order, never waiting on a health check
+
+    :param async_engine: only consider replicas with an async url, otherwise only those with a sync url
+    :return replica, None if none is healthy
+    """
+    candidates = [replica for replica in _replicas if (replica.config.async_url if async_engine else replica.config.url)]
+    if not candidates:
+        return None
+    _start_health_checks()
+    start = next(_next_replica)
+    for offset in range(len(candidates)):
+        replica = candidates[(start + offset) % len(candidates)]
+        if replica.healthy:
+            return replica
+    return None
+
+
+def get_read_engine() -> Engine:
+    """
+    Gets an engine for read-only work, a healthy replica when one is configured, otherwise the primary
+
+    :return engine to read from
+    """
+    replica = _pick_replica()
+    return replica.get_engine() if replica is not None else get_engine()
+
+
+def get_async_read_engine() -> AsyncEngine:
+    """
+    Gets an asyncio engine for read-only work, a healthy replica with an async url when one is configured,
+    otherwise the primary
+
+    :return async engine to read from
+    """
+    replica = _pick_replica(async_engine=True)
+    return replica.get_async_engine() if replica is not None else get_async_engine()
+
+
+@contextmanager
+def session_scope(read_only: bool = False, allow_replica: bool = True) -> Iterator[Session]:
+    """
+    Provides the session a dao works in. Within a request every dao shares the request's session, so the
+    request checks out a single connection and all of its writes commit together when it ends; the block
+    only flushes so integrity errors surface to the dao that caused them. Outside of a request the session
+    belongs to the block and is committed when it ends
+
+    Read-only blocks go to a replica, for the whole request, while the request allows replica reads. Any
+    other block ends that, so reads after a write see it on the primary
+
+    :param read_only: whether the block only reads
+    :param allow_replica: whether a read-only block may go to a replica, pass False for reads that must
+    not lag behind the primary, e.g. ones whose result is cached
+    """
+    state = get_request_state()
+    if state is None:
+        if read_only:
+            with Session(get_read_engine() if allow_replica else get_engine()) as session:
+                yield session
+            return
+        with Session(get_engine()) as session:
+            yield session
+            session.commit()
+        return
+    if read_only and allow_replica and state.replica_reads and _replicas:
+        if state.replica_session is None:
+            state.replica_session = Session(get_read_engine())
+        yield state.replica_session
+        return
+    if not read_only:
+        state.replica_reads = False
+    if state.session is None:
+        state.session = Session(get_engine())
+    yield state.session
+    state.session.flush()
+
+
+def release_connection() -> None:
+    """
+    Ends the request's transaction early so its connection returns to the pool before slow work that does
+    not touch the database. The session checks out a connection again if it is used afterwards. Only call
+    this before the request has written anything
+    """
+    state = get_request_state()
+    if state is not None and state.session is not None:
+        state.session.commit()
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """
+    Runs a callback once the current unit of work commits, so caches are not dropped while its writes are
+    still invisible to other requests, which would reload and cache the old values. Outside of a request
+    every block commits when it ends, so the callback runs straight away
+
+    :param callback: function to run, it is dropped if the request's writes are rolled back
+    """
+    state = get_request_state()
+    if state is None:
+        callback()
+        return
+    state.after_commit.append(callback)
+
+
+def end_unit_of_work(state: RequestState, commit: bool) -> None:
+    """
+    Commits or rolls back the request's session, returns its connections to the pools and, after a
+    commit, runs the callbacks registered with after_commit
+
+    :param state: state of the request that is ending
+    :param commit: whether the request succeeded and its writes should be kept
+    :except Exception if the commit fails, the transaction is rolled back
+    """
+    replica_session, state.replica_session = state.replica_session, None
+    if replica_session is not None:
+        replica_session.close()
+    session, state.session = state.session, None
+    callbacks, state.after_commit = state.after_commit, []
+    if session is not None:
+        with session:
+            if commit:
+                session.commit()
+            else:
+                session.rollback()
+    if commit:
+        for callback in callbacks:
+            callback()
+
+
+def dispose_engine(close: bool = True) -> None:
+    """
+    Drops the shared engines and their pooled connections, they are recreated on next use
+
+    :param close: whether to close the pooled connections, pass False in a freshly forked worker so the
+    connections it inherited are left to the parent rather than closed underneath it
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose(close=close)
+            _engine = None
+    for replica in _replicas:
+        replica.dispose(close)
+
+
+async def dispose_async_engine() -> None:
+    """
+    Closes every pooled connection and drops the shared async engines
+    """
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    for replica in _replicas:
+        await replica.dispose_async()
+
+
+def get_pool_stats(async_pool: bool = False) -> PoolStats:
+    """
+    Gets a snapshot of the shared connection pool. Checkout wait times are shared by both pools
+
+    :param async_pool: whether to describe the async engine's pool instead of the sync one
+    :return pool stats
+    """
+    pool = get_async_engine().pool if async_pool else get_engine().pool
+    return PoolStats(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=max(pool.overflow(), 0),
+        checkouts=_wait_stats.checkouts,
+        total_wait_seconds=_wait_stats.total_wait_seconds,
+        max_wait_seconds=_wait_stats.max_wait_seconds,
+    )
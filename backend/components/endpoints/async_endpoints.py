@@ -0,0 +1,110 @@
+from datetime import datetime
+from typing import Annotated, List, Optional
+
+from components.models.expense import Expense
+from components.models.expense_group import ExpenseGroup
+from components.models.user import User
+from components.services import (auth_service, expense_group_service,
+                                 expense_service, user_service)
+from components.utils.exceptions import (DoesNotExistError, InvalidCursorError,
+                                         UnauthorizedError)
+from components.utils.conditional import is_not_modified, validator_headers
+from components.utils.ndjson import ndjson_chunks_async
+from components.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+AUTH_TAG = "Authentication"
+USERS_TAG = "Users"
+GROUPS_TAG = "Groups"
+
+MAX_PAGE_SIZE = 1000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Read routes served on the asyncio engine. When enabled these are registered ahead of
+# the sync routes in endpoints.py so they take precedence for the same paths. As there,
+# list routes encode the dao rows directly with orjson
+router = APIRouter()
+
+
+@router.get("/users", tags=[USERS_TAG])
+async def get_users_async(user: Annotated[User, Depends(auth_service.get_current_user_async)], limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None, cursor: Optional[str] = None, search: Annotated[Optional[str], Query(min_length=1, max_length=255)] = None) -> List[User]:
+    try:
+        users = await user_service.get_users_async(limit=limit, cursor=cursor, search=search)
+        headers = {}
+        if limit is not None and len(users) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(users[-1]["id"])
+        return ORJSONResponse(users, headers=headers)
+    except InvalidCursorError as ice:
+        raise HTTPException(status_code=400, detail=str(ice))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/groups", tags=[GROUPS_TAG])
+async def get_groups_async(user: Annotated[User, Depends(auth_service.get_current_user_async)], request: Request) -> List[ExpenseGroup]:
+    try:
+        version = await expense_group_service.get_groups_version_async(user.id)
+        headers = validator_headers(version)
+        if is_not_modified(request.headers, version):
+            return Response(status_code=304, headers=headers)
+        return ORJSONResponse(await expense_group_service.get_groups_async(user.id), headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/groups/{id}", tags=[GROUPS_TAG])
+async def get_group_async(user: Annotated[User, Depends(auth_service.get_current_user_async)], id: int) -> Optional[ExpenseGroup]:
+    try:
+        return await expense_group_service.get_group_async(user.id, id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/groups/{id}/members", tags=[GROUPS_TAG])
+async def get_group_members_async(id: int, user: Annotated[User, Depends(auth_service.get_current_user_async)], request: Request) -> List[User]:
+    try:
+        version = await expense_group_service.get_group_version_async(user.id, id)
+        headers = validator_headers(version)
+        if is_not_modified(request.headers, version):
+            return Response(status_code=304, headers=headers)
+        return ORJSONResponse(await expense_group_service.get_group_members_async(user.id, id), headers=headers)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/groups/{id}/expenses", tags=[GROUPS_TAG])
+async def get_expenses_async(user: Annotated[User, Depends(auth_service.get_current_user_async)], request: Request, id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None, cursor: Optional[str] = None, stream: bool = False) -> List[Expense]:
+    try:
+        version = await expense_group_service.get_group_version_async(user.id, id)
+        headers = validator_headers(version)
+        if is_not_modified(request.headers, version):
+            return Response(status_code=304, headers=headers)
+        if stream:
+            expenses = await expense_service.stream_expenses_by_group_async(group_id=id, user_id=user.id, created_before=created_before, created_after=created_after)
+            return StreamingResponse(
+                ndjson_chunks_async(expenses),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=headers,
+            )
+        expenses = await expense_service.get_expenses_by_group_async(group_id=id, user_id=user.id, created_before=created_before, created_after=created_after, limit=limit, cursor=cursor)
+        if limit is not None and len(expenses) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(expenses[-1]["date"], expenses[-1]["id"])
+        return ORJSONResponse(expenses, headers=headers)
+    except InvalidCursorError as ice:
+        raise HTTPException(status_code=400, detail=str(ice))
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/users/me", tags=[AUTH_TAG])
+async def me_async(current_user: Annotated[User, Depends(auth_service.get_current_user_async)]) -> User:
+    return current_user
@@ -1,30 +1,90 @@
+import logging
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional
 
+from components import db
 from components.constants import ACCESS_TOKEN_KEY
+from components.endpoints import async_endpoints
 from components.models.auth.token import Token
+from components.models.balance import MemberBalance, Transfer
 from components.models.expense import Expense
+from components.models.expense_changes import ExpenseChanges
 from components.models.expense_group import ExpenseGroup
+from components.models.expense_import import ImportResult
+from components.models.expense_summary import ExpenseSummary, SummaryBucket
+from components.models.hasher_stats import HasherStats
+from components.models.pool_stats import PoolStats
 from components.models.user import User
-from components.services import (auth_service, expense_group_service,
-                                 expense_service, user_service)
+from components.services import (auth_service, balance_service,
+                                 expense_group_service, expense_service,
+                                 metrics_service, profiler_service,
+                                 user_service)
+from components.settings import get_settings
 from components.utils.exceptions import (CredentialsError, DoesNotExistError,
-                                         ExistsError, UnauthorizedError,
+                                         ExistsError, InvalidCursorError,
+                                         ServiceBusyError, UnauthorizedError,
                                          UsernameExistsError)
-from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from components.utils.conditional import (ETAG_HEADER, is_not_modified,
+                                          validator_headers)
+from components.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from components.utils.ndjson import ndjson_chunks
+from components.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from components.utils.request_context import QueryStats, request_scope
+from components.utils.server_timing import SERVER_TIMING_HEADER, server_timing
+from fastapi import (Body, Depends, FastAPI, HTTPException, Query, Request,
+                     Response, UploadFile)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import (ORJSONResponse, PlainTextResponse,
+                               StreamingResponse)
 from fastapi.security import OAuth2PasswordRequestForm
 
 AUTH_TAG = "Authentication"
 USERS_TAG = "Users"
 GROUPS_TAG = "Groups"
 EXPENSES_TAG = "Expenses"
+HEALTH_TAG = "Health"
+DEBUG_TAG = "Debug"
+
+MAX_PAGE_SIZE = 1000
+RETRY_AFTER_SECONDS = 1
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# requests sent with this header by a user allowed to profile are sampled, the profile id is returned in
+# the second and the collapsed stacks are served from /debug/profile/requests/{id}. Profiles sample whole
+# threads, so they include whatever concurrent requests ran on the event loop and on the request's
+# threadpool workers meanwhile, see profiler_service.start_request_profile
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# only requests with these methods read from replicas, everything else stays on the primary throughout
+REPLICA_READ_METHODS = ("GET", "HEAD")
+# metrics label for requests that matched no route, so unknown paths cannot grow the label set
+UNMATCHED_ROUTE = "unmatched"
+
+# list routes encode the dao rows directly with orjson, their return annotations only document the schema
+
+SETTINGS = get_settings()
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # a worker forked from a parent that already used the database must not share its connections
+    db.dispose_engine(close=False)
+    yield
+    auth_service.shutdown_hasher()
+    await run_in_threadpool(db.dispose_engine)
+    await db.dispose_async_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,37 +92,152 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, PROFILE_ID_HEADER],
 )
 
+if SETTINGS.async_enabled:
+    app.include_router(async_endpoints.router)
+
+
+@app.middleware("http")
+async def scope_request_state(request: Request, call_next):
+    # the unit of work ends here rather than in a yield dependency, whose teardown runs after the response
+    # is sent, so a failed commit still reaches the client as an error
+    start = time.perf_counter()
+    with request_scope() as state:
+        state.replica_reads = request.method in REPLICA_READ_METHODS
+        sampler = None
+        if profiler_service.is_enabled() and PROFILE_HEADER in request.headers:
+            sampler = profiler_service.start_request_profile(state, request.headers.get("Authorization"))
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            route = _route_name(request) or UNMATCHED_ROUTE
+            metrics_service.record_exception(route, e)
+            metrics_service.observe_request(route, request.method, 500, time.perf_counter() - start, state.query_stats)
+            await run_in_threadpool(db.end_unit_of_work, state, False)
+            if sampler is not None:
+                sampler.stop()
+            raise
+        route = _route_name(request) or UNMATCHED_ROUTE
+        try:
+            await run_in_threadpool(db.end_unit_of_work, state, response.status_code < 400)
+        except Exception as e:
+            metrics_service.record_exception(route, e)
+            response = ORJSONResponse({"detail": f"An error occurred committing the request: {e}"}, status_code=500)
+        elapsed = time.perf_counter() - start
+        response.headers[SERVER_TIMING_HEADER] = server_timing(state.query_stats, elapsed)
+        metrics_service.observe_request(route, request.method, response.status_code, elapsed, state.query_stats)
+        _log_request(request, response, state.query_stats, elapsed)
+        if sampler is not None:
+            response.headers[PROFILE_ID_HEADER] = profiler_service.finish_request_profile(sampler)
+        return response
+
+
+@app.exception_handler(HTTPException)
+async def count_http_exception(request: Request, exc: HTTPException):
+    # routes translate service errors into HTTPExceptions, the error they were raised from names the failure
+    metrics_service.record_exception(_route_name(request) or UNMATCHED_ROUTE, exc.__context__ or exc)
+    return await http_exception_handler(request, exc)
+
+
+def _route_name(request: Request) -> Optional[str]:
+    route = request.scope.get("route")
+    return route.name if route is not None else None
+
+
+def _log_request(request: Request, response: Response, stats: QueryStats, elapsed: float) -> None:
+    name = _route_name(request) or request.url.path
+    slow = elapsed * 1000 >= SETTINGS.instrumentation_config.slow_request_ms
+    logger.log(
+        logging.WARNING if slow else logging.DEBUG,
+        "%s%s %s -> %d in %.1fms, %d statements, %d rows, %.1fms in db",
+        "slow request " if slow else "", name, request.method, response.status_code,
+        elapsed * 1000, stats.statements, stats.rows, stats.db_seconds * 1000,
+    )
+
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
 
+@app.get("/metrics", tags=[HEALTH_TAG], response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics_service.render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/debug/profile", tags=[DEBUG_TAG], response_class=PlainTextResponse)
+def profile_worker(user: Annotated[User, Depends(auth_service.get_current_user)], seconds: Annotated[float, Query(gt=0)] = 10, interval_ms: Annotated[Optional[float], Query(ge=1, le=1000)] = None) -> PlainTextResponse:
+    try:
+        profiler_service.authorize(user.username)
+        return PlainTextResponse(profiler_service.profile_worker(seconds, interval_ms))
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+
+
+@app.get("/debug/profile/requests/{profile_id}", tags=[DEBUG_TAG], response_class=PlainTextResponse)
+def get_request_profile(user: Annotated[User, Depends(auth_service.get_current_user)], profile_id: str) -> PlainTextResponse:
+    try:
+        profiler_service.authorize(user.username)
+        return PlainTextResponse(profiler_service.get_request_profile(profile_id))
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+
+
+@app.get("/health/pool", tags=[HEALTH_TAG])
+def get_pool_stats(async_pool: bool = False) -> PoolStats:
+    try:
+        return db.get_pool_stats(async_pool)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/health/hasher", tags=[HEALTH_TAG])
+def get_hasher_stats() -> HasherStats:
+    return auth_service.get_hasher_stats()
+
+
 @app.get("/users", tags=[USERS_TAG])
-def get_users(user: Annotated[User, Depends(auth_service.get_current_user)]) -> List[User]:
+def get_users(user: Annotated[User, Depends(auth_service.get_current_user)], limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None, cursor: Optional[str] = None, search: Annotated[Optional[str], Query(min_length=1, max_length=255)] = None) -> List[User]:
     try:
-        return user_service.get_users()
+        users = user_service.get_users(limit=limit, cursor=cursor, search=search)
+        headers = {}
+        if limit is not None and len(users) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(users[-1]["id"])
+        return ORJSONResponse(users, headers=headers)
+    except InvalidCursorError as ice:
+        raise HTTPException(status_code=400, detail=str(ice))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/users", tags=[USERS_TAG])
-def create_user(username: str, password: str, first_name: str, last_name: str, email: str) -> bool:
+async def create_user(username: str, password: str, first_name: str, last_name: str, email: str) -> bool:
     try:
-        hashed_password = auth_service.hash_password(password)
-        user_service.create_user(username, hashed_password, first_name, last_name, email)
+        hashed_password = await auth_service.hash_password(password)
+        await run_in_threadpool(user_service.create_user, username, hashed_password, first_name, last_name, email)
         return True
     except UsernameExistsError:
         raise HTTPException(status_code=403, detail="Username already exists")
+    except ServiceBusyError as sbe:
+        raise HTTPException(status_code=503, detail=str(sbe), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/groups", tags=[GROUPS_TAG])
-def get_groups(user: Annotated[User, Depends(auth_service.get_current_user)]) -> List[ExpenseGroup]:
+def get_groups(user: Annotated[User, Depends(auth_service.get_current_user)], request: Request) -> List[ExpenseGroup]:
     try:
-        return expense_group_service.get_groups(user.id)
+        version = expense_group_service.get_groups_version(user.id)
+        headers = validator_headers(version)
+        if is_not_modified(request.headers, version):
+            return Response(status_code=304, headers=headers)
+        return ORJSONResponse(expense_group_service.get_groups(user.id), headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -76,9 +251,15 @@ def get_group(user: Annotated[User, Depends(auth_service.get_current_user)], id:
 
 
 @app.get("/groups/{id}/members", tags=[GROUPS_TAG])
-def get_group_members(id: int, user: Annotated[User, Depends(auth_service.get_current_user)]) -> List[User]:
+def get_group_members(id: int, user: Annotated[User, Depends(auth_service.get_current_user)], request: Request) -> List[User]:
     try:
-        return expense_group_service.get_group_members(user.id, id)
+        version = expense_group_service.get_group_version(user.id, id)
+        headers = validator_headers(version)
+        if is_not_modified(request.headers, version):
+            return Response(status_code=304, headers=headers)
+        return ORJSONResponse(expense_group_service.get_group_members(user.id, id), headers=headers)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
     except UnauthorizedError as ue:
         raise HTTPException(status_code=401, detail=str(ue))
     except Exception as e:
@@ -86,9 +267,11 @@ def get_group_members(id: int, user: Annotated[User, Depends(auth_service.get_cu
 
 
 @app.post("/groups/{id}/members", tags=[GROUPS_TAG])
-def add_group_member(user: Annotated[User, Depends(auth_service.get_current_user)], id: int, user_id: int) -> bool:
+def add_group_members(user: Annotated[User, Depends(auth_service.get_current_user)], id: int, user_id: Annotated[List[int], Query()]) -> bool:
     try:
-        return expense_group_service.add_group_member(user.id, id, user_id)
+        return expense_group_service.add_group_members(user.id, id, user_id)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
     except ExistsError as ae:
         raise HTTPException(status_code=403, detail=str(ae))
     except UnauthorizedError as ue:
@@ -108,9 +291,69 @@ def create_group(author: Annotated[User, Depends(auth_service.get_current_user)]
 
 
 @app.get("/groups/{id}/expenses", tags=[GROUPS_TAG])
-def get_expenses(user: Annotated[User, Depends(auth_service.get_current_user)], id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> List[Expense]:
+def get_expenses(user: Annotated[User, Depends(auth_service.get_current_user)], request: Request, id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None, cursor: Optional[str] = None, stream: bool = False) -> List[Expense]:
+    try:
+        version = expense_group_service.get_group_version(user.id, id)
+        headers = validator_headers(version)
+        if is_not_modified(request.headers, version):
+            return Response(status_code=304, headers=headers)
+        if stream:
+            expenses = expense_service.stream_expenses_by_group(group_id=id, user_id=user.id, created_before=created_before, created_after=created_after)
+            return StreamingResponse(
+                ndjson_chunks(expenses),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=headers,
+            )
+        expenses = expense_service.get_expenses_by_group(group_id=id, user_id=user.id, created_before=created_before, created_after=created_after, limit=limit, cursor=cursor)
+        if limit is not None and len(expenses) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(expenses[-1]["date"], expenses[-1]["id"])
+        return ORJSONResponse(expenses, headers=headers)
+    except InvalidCursorError as ice:
+        raise HTTPException(status_code=400, detail=str(ice))
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/groups/{id}/expenses/changes", tags=[GROUPS_TAG])
+def get_expense_changes(user: Annotated[User, Depends(auth_service.get_current_user)], id: int, since: Annotated[Optional[int], Query(ge=0)] = None) -> ExpenseChanges:
+    try:
+        return expense_service.get_expense_changes(group_id=id, user_id=user.id, since=since)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/groups/{id}/summary", tags=[GROUPS_TAG])
+def get_expense_summary(user: Annotated[User, Depends(auth_service.get_current_user)], id: int, bucket: SummaryBucket = SummaryBucket.month, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> ExpenseSummary:
+    try:
+        return expense_service.get_expense_summary(group_id=id, user_id=user.id, bucket=bucket, created_before=created_before, created_after=created_after)
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/groups/{id}/balances", tags=[GROUPS_TAG])
+def get_balances(user: Annotated[User, Depends(auth_service.get_current_user)], id: int) -> List[MemberBalance]:
+    try:
+        return balance_service.get_balances(user.id, id)
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/groups/{id}/settlement", tags=[GROUPS_TAG])
+def get_settlement(user: Annotated[User, Depends(auth_service.get_current_user)], id: int) -> List[Transfer]:
     try:
-        return expense_service.get_expenses_by_group(group_id=id, user_id=user.id, created_before=created_before, created_after=created_after)
+        return balance_service.get_settlement(user.id, id)
     except UnauthorizedError as ue:
         raise HTTPException(status_code=401, detail=str(ue))
     except Exception as e:
@@ -129,10 +372,38 @@ def create_expense(author: Annotated[User, Depends(auth_service.get_current_user
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/groups/{id}/expenses/bulk", tags=[GROUPS_TAG])
+def bulk_create_expenses(author: Annotated[User, Depends(auth_service.get_current_user)], id: int, expenses: Annotated[List[Any], Body()]) -> ImportResult:
+    try:
+        return expense_service.bulk_create_expenses(author.id, id, expenses)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/groups/{id}/expenses/import", tags=[GROUPS_TAG])
+def import_expenses(author: Annotated[User, Depends(auth_service.get_current_user)], id: int, file: UploadFile) -> ImportResult:
+    try:
+        return expense_service.import_expenses_csv(author.id, id, file.file)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
+    except UnauthorizedError as ue:
+        raise HTTPException(status_code=401, detail=str(ue))
+    except UnicodeDecodeError as ude:
+        raise HTTPException(status_code=400, detail=f"File is not valid utf-8 csv: {ude}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.patch("/expenses/{id}", tags=[EXPENSES_TAG])
 def update_expense(user: Annotated[User, Depends(auth_service.get_current_user)], id: int, title: Optional[str] = None, price: Optional[float] = None, description: Optional[str] = None) -> bool:
     try:
         return expense_service.update_expense(expense_id=id, user_id=user.id, title=title, price=price, description=description)
+    except DoesNotExistError as dne:
+        raise HTTPException(status_code=404, detail=str(dne))
     except UnauthorizedError as ue:
         raise HTTPException(status_code=401, detail=str(ue))
     except Exception as e:
@@ -152,9 +423,9 @@ def delete_expense(user: Annotated[User, Depends(auth_service.get_current_user)]
     
 
 @app.post("/token", tags=[AUTH_TAG])
-def login(response: Response, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
+async def login(response: Response, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
     try:
-       token = auth_service.login(form_data)
+       token = await auth_service.login(form_data)
        response.set_cookie(
            key=ACCESS_TOKEN_KEY,
            value=token.access_token,
@@ -167,6 +438,8 @@ def login(response: Response, form_data: Annotated[OAuth2PasswordRequestForm, De
             detail=str(ce),
             headers={"WWW-Authenticate": "Bearer"},
         )
+    except ServiceBusyError as sbe:
+        raise HTTPException(status_code=503, detail=str(sbe), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
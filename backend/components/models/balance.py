@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+class MemberBalance(BaseModel):
+    """
+    Represents a member's running balance within a group, positive when they are owed money
+    """
+    user_id: int
+    balance: float
+
+
+class Transfer(BaseModel):
+    """
+    Represents a payment one member should make to another to settle up
+    """
+    from_user_id: int
+    to_user_id: int
+    amount: float
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class CacheStats(BaseModel):
+    """
+    Represents a snapshot of an in-process cache
+    """
+    size: int
+    hits: int
+    misses: int
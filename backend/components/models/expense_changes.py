@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from components.models.expense import Expense
+
+class ExpenseChanges(BaseModel):
+    """
+    Represents the expenses of a group that changed since a watermark. Pass the watermark back to get the next delta
+    """
+    watermark: int
+    changed: List[Expense]
+    deleted: List[int]
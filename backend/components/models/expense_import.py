@@ -0,0 +1,27 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+class ExpenseCreate(BaseModel):
+    """
+    Represents a single expense to be created in bulk
+    """
+    title: str
+    price: float
+    description: Optional[str] = None
+
+
+class RowError(BaseModel):
+    """
+    Represents a row that could not be imported
+    """
+    index: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    """
+    Represents the outcome of a bulk expense import
+    """
+    created: int
+    errors: List[RowError]
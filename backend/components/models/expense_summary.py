@@ -0,0 +1,41 @@
+from datetime import date
+from enum import Enum
+from typing import List
+
+from pydantic import BaseModel
+
+class SummaryBucket(str, Enum):
+    """
+    Represents the time period expenses are grouped into
+    """
+    day = "day"
+    month = "month"
+    year = "year"
+
+
+class MemberSpending(BaseModel):
+    """
+    Represents how much a single member has spent
+    """
+    author_id: int
+    total: float
+    count: int
+
+
+class PeriodSpending(BaseModel):
+    """
+    Represents how much was spent within a single time period
+    """
+    period_start: date
+    total: float
+    count: int
+
+
+class ExpenseSummary(BaseModel):
+    """
+    Represents aggregated spending for an expense group
+    """
+    total: float
+    count: int
+    by_member: List[MemberSpending]
+    by_period: List[PeriodSpending]
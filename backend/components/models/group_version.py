@@ -0,0 +1,11 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+class GroupVersion(BaseModel):
+    """
+    Represents the current version of one or more expense groups, changes whenever their expenses or members do
+    """
+    tag: str
+    modified_date: Optional[datetime]
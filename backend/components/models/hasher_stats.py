@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+class HasherStats(BaseModel):
+    """
+    Represents a snapshot of the password hashing executor
+    """
+    workers: int
+    in_flight: int
+    queue_depth: int
+    completed: int
+    rejected: int
+    total_seconds: float
@@ -1,7 +1,8 @@
 from datetime import datetime
+from decimal import Decimal
 from typing import Optional
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Table, DateTime
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, Numeric, String, Table
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -19,6 +20,10 @@ class AuthUserTbl(Base):
 
 class UserTbl(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        Index("ix_user_first_name", "first_name"),
+        Index("ix_user_last_name", "last_name"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(String(255), unique=True)
@@ -30,13 +35,20 @@ class UserTbl(Base):
 ExpenseGroupMembersTbl = Table(
     "expense_group_members",
     Base.metadata,
-    Column("group_id", Integer, ForeignKey("expense_group.id")),
-    Column("user_id", Integer, ForeignKey("user.id")),
+    Column("group_id", Integer, ForeignKey("expense_group.id"), primary_key=True),
+    Column("user_id", Integer, ForeignKey("user.id"), primary_key=True),
+    Column("joined_date", DateTime, nullable=False),
+    Index("ix_expense_group_members_user_id", "user_id"),
 )
 
 
 class ExpenseTbl(Base):
     __tablename__ = "expense"
+    __table_args__ = (
+        Index("ix_expense_group_id_date", "group_id", "date"),
+        Index("ix_expense_author_id", "author_id"),
+        Index("ix_expense_group_id_version", "group_id", "version"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(255))
@@ -45,6 +57,21 @@ class ExpenseTbl(Base):
     date: Mapped[datetime]
     author_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
     group_id: Mapped[int] = mapped_column(ForeignKey("expense_group.id"))
+    # group version that last created or edited the expense, backs delta syncs
+    version: Mapped[int] = mapped_column(default=0)
+    updated_date: Mapped[datetime] = mapped_column(DateTime)
+
+
+class ExpenseTombstoneTbl(Base):
+    __tablename__ = "expense_tombstone"
+    __table_args__ = (
+        Index("ix_expense_tombstone_group_id_version", "group_id", "version"),
+    )
+
+    expense_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    group_id: Mapped[int] = mapped_column(ForeignKey("expense_group.id"))
+    version: Mapped[int]
+    deleted_date: Mapped[datetime] = mapped_column(DateTime)
 
 
 class ExpenseGroupTbl(Base):
@@ -54,5 +81,16 @@ class ExpenseGroupTbl(Base):
     name: Mapped[str] = mapped_column(String(255))
     author_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
     created_date: Mapped[datetime] = mapped_column(DateTime)
+    # bumped by every change to the group's expenses or members, backs conditional GETs
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+    modified_date: Mapped[datetime] = mapped_column(DateTime)
 
     author: Mapped["UserTbl"] = relationship()
+
+
+class ExpenseGroupBalanceTbl(Base):
+    __tablename__ = "expense_group_balance"
+
+    group_id: Mapped[int] = mapped_column(ForeignKey("expense_group.id"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+    balance: Mapped[Decimal] = mapped_column(Numeric(12, 2), default=0)
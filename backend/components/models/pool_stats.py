@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+class PoolStats(BaseModel):
+    """
+    Represents a snapshot of the database connection pool
+    """
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    total_wait_seconds: float
+    max_wait_seconds: float
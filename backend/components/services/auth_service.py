@@ -1,32 +1,52 @@
+import time
 from datetime import datetime, timedelta
-from typing import Annotated, Optional
+from functools import partial
+from typing import Annotated, Optional, Tuple
 
+from components import db
 from components.constants import ACCESS_TOKEN_KEY
 from components.daos import auth_dao, user_dao
 from components.models.auth.auth_user import AuthUser
 from components.models.auth.token import Token
+from components.models.cache_stats import CacheStats
+from components.models.hasher_stats import HasherStats
 from components.models.user import User
+from components.settings import get_settings
+from components.utils.cache import TTLCache
 from components.utils.exceptions import CredentialsError
+from components.utils.password_hasher import PasswordHasher
 from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 _oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+SETTINGS = get_settings()
 
-def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
+_password_hasher = PasswordHasher(
+    workers=SETTINGS.hasher_config.workers,
+    max_queue=SETTINGS.hasher_config.max_queue,
+)
+
+_principal_cache = TTLCache(
+    max_size=SETTINGS.auth_config.principal_cache_size,
+    ttl_seconds=SETTINGS.auth_config.principal_cache_ttl_seconds,
+)
+
+
+async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
     """
     Authenticates and logs in a user
 
     :param form_data: data containing username and password
     :return access token
+    :except ServiceBusyError if too many password operations are queued
     """
-    user = authenticate(form_data.username, form_data.password)
+    user = await authenticate(form_data.username, form_data.password)
     if not user:
         raise CredentialsError("Could not validate credentials")
     access_token = create_access_token(user.username)
@@ -36,30 +56,57 @@ def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
     )
 
 
-def authenticate(username: str, password: str) -> Optional[AuthUser]:
+async def authenticate(username: str, password: str) -> Optional[AuthUser]:
     """
-    Authenticates a user
+    Authenticates a user, the lookup runs on the threadpool and the password check on the hasher
 
     :param username: inputted username
     :param password: inputted password
     :return auth user if properly authenticated
+    :except ServiceBusyError if too many password operations are queued
     """
-    user = _get_auth_user_by_username(username)
+    user = await run_in_threadpool(_get_auth_user_for_login, username)
     return (
         user
-        if user and _pwd_context.verify(password, user.hashed_password)
+        if user and await _password_hasher.verify(password, user.hashed_password)
         else None
     )
 
 
-def hash_password(password: str) -> str:
+async def hash_password(password: str) -> str:
     """
     Hashes a plaintext password
 
     :param password: plaintext password to hash
     :return hashed password
+    :except ServiceBusyError if too many password operations are queued
+    """
+    return await _password_hasher.hash(password)
+
+
+def shutdown_hasher() -> None:
+    """
+    Stops the password hashing worker processes, should be called when the app shuts down
+    """
+    _password_hasher.shutdown()
+
+
+def get_hasher_stats() -> HasherStats:
     """
-    return _pwd_context.hash(password)
+    Gets a snapshot of the password hashing queue
+
+    :return hasher stats
+    """
+    return _password_hasher.stats()
+
+
+def get_principal_cache_stats() -> CacheStats:
+    """
+    Gets a snapshot of the cache of authenticated users
+
+    :return cache stats
+    """
+    return _principal_cache.stats()
 
 
 def get_current_user(token: Annotated[str, Depends(_oauth2_scheme)]) -> User:
@@ -69,32 +116,72 @@ def get_current_user(token: Annotated[str, Depends(_oauth2_scheme)]) -> User:
     :param token: access token
     :return current user
     :except 401 exception if user is not properly authenticated
-    :except 500 exception if the user is properly authenticated but not found in the db
     """
-    try:
-        payload = jwt.decode(token, ACCESS_TOKEN_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise CredentialsError("Could not validate credentials")
-    
-    username = payload.get("sub")
-    if username is None:
-        raise CredentialsError("Could not validate credentials")
-    
-    exp_timestamp = payload.get("exp")
-    if exp_timestamp is None or datetime.fromtimestamp(exp_timestamp) < datetime.now():
-        raise CredentialsError("Acess token is expired")
+    username, exp_timestamp = _decode_access_token(token)
+
+    cached_user = _principal_cache.get(username)
+    if cached_user is not None:
+        return cached_user
 
-    auth_user = _get_auth_user_by_username(username)
-    if auth_user is None:
+    user = _get_user_by_username(username)
+    if user is None:
         raise CredentialsError("Could not validate credentials")
-    
-    user = _get_user_by_id(auth_user.user_id)
+
+    _principal_cache.set(username, user, ttl_seconds=exp_timestamp - time.time())
+    return user
+
+
+async def get_current_user_async(token: Annotated[str, Depends(_oauth2_scheme)]) -> User:
+    """
+    Given a token, gets the currently authenticated user on the async engine
+
+    :param token: access token
+    :return current user
+    :except 401 exception if user is not properly authenticated
+    """
+    username, exp_timestamp = _decode_access_token(token)
+
+    cached_user = _principal_cache.get(username)
+    if cached_user is not None:
+        return cached_user
+
+    user = await user_dao.get_user_by_username_async(username)
     if user is None:
-        raise Exception("User properly authenticated but not found in db")
-    
+        raise CredentialsError("Could not validate credentials")
+
+    _principal_cache.set(username, user, ttl_seconds=exp_timestamp - time.time())
     return user
 
 
+def invalidate_principal(username: str) -> None:
+    """
+    Drops a cached authenticated user once the request commits, should be called whenever the user is
+    created or changed
+
+    :param username: username of the user to drop
+    """
+    db.after_commit(partial(_principal_cache.delete, username))
+
+
+def clear_principal_cache() -> None:
+    """
+    Drops every cached authenticated user
+    """
+    _principal_cache.clear()
+
+
+def get_token_username(token: str) -> str:
+    """
+    Validates an access token without looking the user up
+
+    :param token: access token
+    :return username the token was issued to
+    :except CredentialsError if the token is invalid or expired
+    """
+    username, _ = _decode_access_token(token)
+    return username
+
+
 def create_access_token(username: str, ttl: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)) -> str:
     """
     Creates an access token for a given user
@@ -110,6 +197,30 @@ def create_access_token(username: str, ttl: timedelta = timedelta(minutes=ACCESS
     return jwt.encode(token, ACCESS_TOKEN_KEY, algorithm=ALGORITHM)
 
 
+def _decode_access_token(token: str) -> Tuple[str, float]:
+    """
+    Validates an access token
+
+    :param token: access token
+    :return username and expiration timestamp of the token
+    :except CredentialsError if the token is invalid or expired
+    """
+    try:
+        payload = jwt.decode(token, ACCESS_TOKEN_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise CredentialsError("Could not validate credentials")
+    
+    username = payload.get("sub")
+    if username is None:
+        raise CredentialsError("Could not validate credentials")
+    
+    exp_timestamp = payload.get("exp")
+    if exp_timestamp is None or datetime.fromtimestamp(exp_timestamp) < datetime.now():
+        raise CredentialsError("Acess token is expired")
+
+    return username, exp_timestamp
+
+
 def _get_auth_user_by_username(username: str) -> Optional[AuthUser]:
     """
     Gets an auth user based on a username
@@ -120,11 +231,18 @@ def _get_auth_user_by_username(username: str) -> Optional[AuthUser]:
     return auth_dao.get_user_by_username(username)
 
 
-def _get_user_by_id(id: int) -> Optional[User]:
+def _get_auth_user_for_login(username: str) -> Optional[AuthUser]:
+    user = _get_auth_user_by_username(username)
+    # login only reads, so the connection is returned before the slow password check
+    db.release_connection()
+    return user
+
+
+def _get_user_by_username(username: str) -> Optional[User]:
     """
-    Gets a user with a given id
+    Gets the user tied to an auth username
 
     :param username: username associated with the user
     :return User if exists, else None
     """
-    return user_dao.get_user_by_id(id)
+    return user_dao.get_user_by_username(username)
@@ -0,0 +1,67 @@
+from typing import List
+
+from components.daos import balance_dao
+from components.models.balance import MemberBalance, Transfer
+from components.services import expense_group_service
+from components.utils.exceptions import UnauthorizedError
+
+# balances within half a cent of zero are treated as settled
+SETTLED_THRESHOLD = 0.005
+
+
+def get_balances(user_id: int, group_id: int) -> List[MemberBalance]:
+    """
+    Gets the running balance of every member of a group
+
+    :param user_id: id of user making the query
+    :param group_id: id of group
+    :return balances, positive when a member is owed money
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not expense_group_service.user_is_member(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return balance_dao.get_balances(group_id)
+
+
+def get_settlement(user_id: int, group_id: int) -> List[Transfer]:
+    """
+    Gets a set of transfers that settles every balance in a group
+
+    :param user_id: id of user making the query
+    :param group_id: id of group
+    :return transfers to make
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    return settle(get_balances(user_id, group_id))
+
+
+def settle(balances: List[MemberBalance]) -> List[Transfer]:
+    """
+    Computes transfers that bring every balance to zero by repeatedly paying the largest creditor from
+    the largest debtor. This needs at most one fewer transfer than there are members with a balance
+
+    :param balances: member balances, expected to sum to zero
+    :return transfers to make
+    """
+    creditors = sorted(
+        ([balance.balance, balance.user_id] for balance in balances if balance.balance > SETTLED_THRESHOLD),
+        reverse=True,
+    )
+    debtors = sorted(
+        ([-balance.balance, balance.user_id] for balance in balances if balance.balance < -SETTLED_THRESHOLD),
+        reverse=True,
+    )
+    transfers = []
+    creditor_index = debtor_index = 0
+    while creditor_index < len(creditors) and debtor_index < len(debtors):
+        credit, creditor_id = creditors[creditor_index]
+        debt, debtor_id = debtors[debtor_index]
+        amount = min(credit, debt)
+        transfers.append(Transfer(from_user_id=debtor_id, to_user_id=creditor_id, amount=round(amount, 2)))
+        creditors[creditor_index][0] -= amount
+        debtors[debtor_index][0] -= amount
+        if creditors[creditor_index][0] <= SETTLED_THRESHOLD:
+            creditor_index += 1
+        if debtors[debtor_index][0] <= SETTLED_THRESHOLD:
+            debtor_index += 1
+    return transfers
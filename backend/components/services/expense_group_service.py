@@ -1,17 +1,30 @@
-from typing import List, Optional
+from functools import partial
+from typing import Any, Dict, FrozenSet, List, Optional
 
+from components import db
 from components.daos import expense_group_dao, user_dao
+from components.models.cache_stats import CacheStats
 from components.models.expense_group import ExpenseGroup
-from components.models.user import User
+from components.models.group_version import GroupVersion
+from components.settings import get_settings
+from components.utils.cache import TTLCache
 from components.utils.exceptions import DoesNotExistError, ExistsError, UnauthorizedError
+from components.utils.request_context import get_request_state
 
+SETTINGS = get_settings()
 
-def get_groups(user_id: int) -> List[ExpenseGroup]:
+_membership_cache = TTLCache(
+    max_size=SETTINGS.auth_config.membership_cache_size,
+    ttl_seconds=SETTINGS.auth_config.membership_cache_ttl_seconds,
+)
+
+
+def get_groups(user_id: int) -> List[Dict[str, Any]]:
     """
     Gets all expense groups for a given user
 
     :param user_id: id of user to get the groups for
-    :return list of expense groups
+    :return list of group rows shaped like ExpenseGroup
     """
     return expense_group_dao.get_groups(user_id)
 
@@ -25,41 +38,47 @@ def get_group(user_id: int, group_id: int) -> Optional[ExpenseGroup]:
     :return expense group if it exists
     :except UnauthorizedError if user does not belong to the requested group
     """
-    if not expense_group_dao.user_is_member(user_id, group_id):
+    if not user_is_member(user_id, group_id):
         raise UnauthorizedError("User does not belong to the requested group")
     return expense_group_dao.get_group(group_id)
 
 
-def get_group_members(user_id: int, group_id: int) -> List[User]:
+def get_group_members(user_id: int, group_id: int) -> List[Dict[str, Any]]:
     """
     Gets all members for a given group. If the user tries to query a group they don't belong to, throw an error
 
     :param user_id: id of user making the query
     :param group_id: id of group to get members for
-    :return list of users who are members of the group
+    :return list of user rows shaped like User for the members of the group
     """
-    if not expense_group_dao.user_is_member(user_id, group_id):
+    if not user_is_member(user_id, group_id):
         raise UnauthorizedError("User does not belong to the requested group")
     return user_dao.get_group_members(group_id)
 
 
-def add_group_member(member_id: int, group_id: int, user_id: int) -> bool:
+def add_group_members(member_id: int, group_id: int, user_ids: List[int]) -> bool:
     """
-    Adds a member to a group
+    Adds several members to a group, validating every user with one query and inserting them with one statement
 
-    :param member_id: id of member adding the user
-    :param group_id: id of group the member is being added to
-    :param user_id: id of user being added to the group
+    :param member_id: id of member adding the users
+    :param group_id: id of group the members are being added to
+    :param user_ids: ids of users being added to the group
     :except Unauthorized error if the user does not belong to the requested group
-    :except ExistsError if the user being added is already a member of the group
+    :except DoesNotExistError if a user being added does not exist
+    :except ExistsError if a user being added is already a member of the group
     """
-    if not user_dao.user_exists(user_id):
-        raise DoesNotExistError("Requested user does not exist")
-    elif not expense_group_dao.user_is_member(member_id, group_id):
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_is_member(member_id, group_id):
         raise UnauthorizedError("User making request does not belong to the requested group")
-    elif expense_group_dao.user_is_member(user_id, group_id):
-        raise ExistsError("User requested to be added to the group is already a member")
-    return expense_group_dao.add_member(group_id, user_id)
+    missing = set(user_ids) - user_dao.get_existing_user_ids(user_ids)
+    if missing:
+        raise DoesNotExistError(f"Requested users do not exist: {sorted(missing)}")
+    existing_members = expense_group_dao.get_members_among(group_id, user_ids)
+    if existing_members:
+        raise ExistsError(f"Users requested to be added to the group are already members: {sorted(existing_members)}")
+    added = expense_group_dao.add_members(group_id, user_ids)
+    invalidate_memberships(*user_ids)
+    return added
 
 
 def create_group(author_id: int, name: str, members: List[int] = []) -> int:
@@ -71,4 +90,175 @@ def create_group(author_id: int, name: str, members: List[int] = []) -> int:
     :param members: ids of users in the group
     :return id of newly created group
     """
-    return expense_group_dao.create_group(author_id, name, members)
+    group_id = expense_group_dao.create_group(author_id, name, members)
+    invalidate_memberships(author_id, *members)
+    return group_id
+
+
+def get_groups_version(user_id: int) -> GroupVersion:
+    """
+    Gets the combined version of every group a user belongs to
+
+    :param user_id: id of user
+    :return combined version of the user's groups
+    """
+    return expense_group_dao.get_groups_version(user_id)
+
+
+def get_group_version(user_id: int, group_id: int) -> GroupVersion:
+    """
+    Gets the version of a group, which changes whenever its expenses or members do
+
+    :param user_id: id of user making the query
+    :param group_id: id of group
+    :return version of the group
+    :except UnauthorizedError if user does not belong to the requested group
+    :except DoesNotExistError if the group does not exist
+    """
+    if not user_is_member(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    version = expense_group_dao.get_group_version(group_id)
+    if version is None:
+        raise DoesNotExistError(f"Group with id {group_id} does not exist")
+    return version
+
+
+def user_is_member(user_id: int, group_id: int) -> bool:
+    """
+    Determines if a user is a member of a given group. The user's memberships are loaded at most
+    once per request and shared across requests for a short time
+
+    :param user_id: id of user
+    :param group_id: id of group
+    :return true if the user is a member of the group
+    """
+    return group_id in _get_memberships(user_id)
+
+
+async def user_is_member_async(user_id: int, group_id: int) -> bool:
+    """
+    Determines if a user is a member of a given group on the async engine
+
+    :param user_id: id of user
+    :param group_id: id of group
+    :return true if the user is a member of the group
+    """
+    memberships = _get_cached_memberships(user_id)
+    if memberships is None:
+        memberships = await expense_group_dao.get_group_ids_for_user_async(user_id)
+        _cache_memberships(user_id, memberships)
+    return group_id in memberships
+
+
+def invalidate_memberships(*user_ids: int) -> None:
+    """
+    Drops cached memberships, should be called whenever a user joins or leaves a group. The request's own
+    copy is dropped straight away, the shared one once the request commits
+
+    :param user_ids: ids of users whose memberships changed
+    """
+    state = get_request_state()
+    for user_id in user_ids:
+        if state is not None:
+            state.memberships.pop(user_id, None)
+        db.after_commit(partial(_membership_cache.delete, user_id))
+
+
+def get_membership_cache_stats() -> CacheStats:
+    """
+    Gets a snapshot of the cache of group memberships used for authorization
+
+    :return cache stats
+    """
+    return _membership_cache.stats()
+
+
+def _get_memberships(user_id: int) -> FrozenSet[int]:
+    memberships = _get_cached_memberships(user_id)
+    if memberships is None:
+        memberships = expense_group_dao.get_group_ids_for_user(user_id)
+        _cache_memberships(user_id, memberships)
+    return memberships
+
+
+def _get_cached_memberships(user_id: int) -> Optional[FrozenSet[int]]:
+    state = get_request_state()
+    if state is not None and user_id in state.memberships:
+        return state.memberships[user_id]
+    memberships = _membership_cache.get(user_id)
+    if memberships is not None and state is not None:
+        state.memberships[user_id] = memberships
+    return memberships
+
+
+def _cache_memberships(user_id: int, memberships: FrozenSet[int]) -> None:
+    state = get_request_state()
+    if state is not None:
+        state.memberships[user_id] = memberships
+    _membership_cache.set(user_id, memberships)
+
+
+async def get_groups_async(user_id: int) -> List[Dict[str, Any]]:
+    """
+    Gets all expense groups for a given user on the async engine
+
+    :param user_id: id of user to get the groups for
+    :return list of group rows shaped like ExpenseGroup
+    """
+    return await expense_group_dao.get_groups_async(user_id)
+
+
+async def get_group_async(user_id: int, group_id: int) -> Optional[ExpenseGroup]:
+    """
+    Gets an expense group for a given user on the async engine
+
+    :param user_id: id of user to get the groups for
+    :param group_id: id of group to get
+    :return expense group if it exists
+    :except UnauthorizedError if user does not belong to the requested group
+    """
+    if not await user_is_member_async(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return await expense_group_dao.get_group_async(group_id)
+
+
+async def get_group_members_async(user_id: int, group_id: int) -> List[Dict[str, Any]]:
+    """
+    Gets all members for a given group on the async engine
+
+    :param user_id: id of user making the query
+    :param group_id: id of group to get members for
+    :return list of user rows shaped like User for the members of the group
+    :except UnauthorizedError if user does not belong to the requested group
+    """
+    if not await user_is_member_async(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return await user_dao.get_group_members_async(group_id)
+
+
+async def get_groups_version_async(user_id: int) -> GroupVersion:
+    """
+    Gets the combined version of every group a user belongs to on the async engine
+
+    :param user_id: id of user
+    :return combined version of the user's groups
+    """
+    return await expense_group_dao.get_groups_version_async(user_id)
+
+
+async def get_group_version_async(user_id: int, group_id: int) -> GroupVersion:
+    """
+    Gets the version of a group on the async engine
+
+    :param user_id: id of user making the query
+    :param group_id: id of group
+    :return version of the group
+    :except UnauthorizedError if user does not belong to the requested group
+    :except DoesNotExistError if the group does not exist
+    """
+    if not await user_is_member_async(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    version = await expense_group_dao.get_group_version_async(group_id)
+    if version is None:
+        raise DoesNotExistError(f"Group with id {group_id} does not exist")
+    return version
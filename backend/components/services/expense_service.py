@@ -1,12 +1,18 @@
+import csv
+import io
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional
 
-from components.daos import expense_dao, expense_group_dao
-from components.models.expense import Expense
+from components.daos import expense_dao
+from components.services import expense_group_service
+from components.models.expense_changes import ExpenseChanges
+from components.models.expense_import import ExpenseCreate, ImportResult, RowError
+from components.models.expense_summary import ExpenseSummary, SummaryBucket
 from components.utils.exceptions import UnauthorizedError
+from pydantic import ValidationError
 
 
-def get_expenses_by_group(group_id: int, user_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> List[Expense]:
+def get_expenses_by_group(group_id: int, user_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Gets expenses for a given group
 
@@ -14,12 +20,62 @@ def get_expenses_by_group(group_id: int, user_id: int, created_before: Optional[
     :param user_id: id of user making the query
     :param created_before: only return expenses created before this date
     :param created_after: only return expenses created after this date
-    :return list of expenses
+    :param limit: maximum number of expenses to return
+    :param cursor: only return expenses after the one this cursor was created from
+    :return list of expense rows shaped like Expense
     :except UnauthorizedError if the user does not belong to the requested group
     """
-    if not expense_group_dao.user_is_member(user_id, group_id):
+    if not expense_group_service.user_is_member(user_id, group_id):
         raise UnauthorizedError("User does not belong to the requested group")
-    return expense_dao.get_expenses_by_group(group_id=group_id, created_before=created_before, created_after=created_after)
+    return expense_dao.get_expenses_by_group(group_id=group_id, created_before=created_before, created_after=created_after, limit=limit, cursor=cursor)
+
+
+def stream_expenses_by_group(group_id: int, user_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams expenses for a given group. Membership is checked before the stream is returned
+
+    :param group_id: id of group to get expenses for
+    :param user_id: id of user making the query
+    :param created_before: only return expenses created before this date
+    :param created_after: only return expenses created after this date
+    :return iterator over expense rows shaped like Expense
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not expense_group_service.user_is_member(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return expense_dao.stream_expenses_by_group(group_id=group_id, created_before=created_before, created_after=created_after)
+
+
+def get_expense_changes(group_id: int, user_id: int, since: Optional[int] = None) -> ExpenseChanges:
+    """
+    Gets the expenses of a group created, edited or deleted since a watermark
+
+    :param group_id: id of group to get changes for
+    :param user_id: id of user making the query
+    :param since: watermark returned by a previous call, None to get every expense
+    :return changed expenses, ids of deleted expenses and the watermark to pass next time
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not expense_group_service.user_is_member(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return expense_dao.get_expense_changes(group_id=group_id, since=since)
+
+
+def get_expense_summary(group_id: int, user_id: int, bucket: SummaryBucket = SummaryBucket.month, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> ExpenseSummary:
+    """
+    Gets spending totals for a given group per member and per time period
+
+    :param group_id: id of group to summarize
+    :param user_id: id of user making the query
+    :param bucket: time period to group expenses into
+    :param created_before: only include expenses created before this date
+    :param created_after: only include expenses created after this date
+    :return expense summary
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not expense_group_service.user_is_member(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return expense_dao.get_expense_summary(group_id=group_id, bucket=bucket, created_before=created_before, created_after=created_after)
 
 
 def create_expense(author_id: int, title: str, price: float, group_id: int, description: Optional[str] = None) -> int:
@@ -34,11 +90,54 @@ def create_expense(author_id: int, title: str, price: float, group_id: int, desc
     :return id of newly created expense
     :except Unauthorized error if the user does not belong to the requested group
     """
-    if not expense_group_dao.user_is_member(author_id, group_id):
+    if not expense_group_service.user_is_member(author_id, group_id):
         raise UnauthorizedError("User does not belong to the requested group")
     return expense_dao.create_expense(author_id, title, price, group_id, description)
 
 
+def bulk_create_expenses(author_id: int, group_id: int, rows: List[Any]) -> ImportResult:
+    """
+    Creates many expenses at once. Rows that fail validation are reported and skipped, the rest are
+    created in a single transaction
+
+    :param author_id: id of user creating the expenses
+    :param group_id: id of group to tie the expenses to
+    :param rows: raw expenses, each an object with a title, price and optional description, anything else is
+    reported as a rejected row
+    :return number of expenses created and the rows that were rejected
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not expense_group_service.user_is_member(author_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    expenses = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            expenses.append(ExpenseCreate.model_validate(row))
+        except ValidationError as ve:
+            errors.append(RowError(index=index, error="; ".join(_describe_error(error) for error in ve.errors())))
+    created = expense_dao.bulk_create_expenses(author_id, group_id, expenses)
+    return ImportResult(created=created, errors=errors)
+
+
+def import_expenses_csv(author_id: int, group_id: int, csv_file: BinaryIO) -> ImportResult:
+    """
+    Creates expenses from a utf-8 csv file with a header row naming the title, price and description columns
+
+    :param author_id: id of user creating the expenses
+    :param group_id: id of group to tie the expenses to
+    :param csv_file: csv file contents
+    :return number of expenses created and the rows that were rejected, indexed from the first data row
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    reader = csv.DictReader(io.TextIOWrapper(csv_file, encoding="utf-8-sig", newline=""))
+    rows = [
+        {key: value for key, value in row.items() if key is not None and value != ""}
+        for row in reader
+    ]
+    return bulk_create_expenses(author_id, group_id, rows)
+
+
 def update_expense(expense_id: int, user_id: int, title: Optional[str] = None, price: Optional[float] = None, description: Optional[str] = None):
     """
     Updates an expense
@@ -49,11 +148,10 @@ def update_expense(expense_id: int, user_id: int, title: Optional[str] = None, p
     :param price: updated price
     :param description: updated description
     :return True if the expense was updated
+    :except DoesNotExistError if the expense does not exist
     :except Unauthorized error if the user did not create the given expense
     """
-    if not expense_dao.user_is_author(user_id, expense_id):
-        raise UnauthorizedError("User did not create an expense with the provided id")
-    return expense_dao.update_expense(id=expense_id, title=title, price=price, description=description)
+    return expense_dao.update_expense(id=expense_id, author_id=user_id, title=title, price=price, description=description)
 
 
 def delete_expense(user_id: int, expense_id: int) -> bool:
@@ -63,8 +161,48 @@ def delete_expense(user_id: int, expense_id: int) -> bool:
     :param user_id: id of user deleting the expense
     :param expense_id: id of expense to delete
     :return True if the expense was deleted
+    :except DoesNotExistError if the expense does not exist
     :except UnauthorizedError if the user did not create the given expense
     """
-    if not expense_dao.user_is_author(user_id, expense_id):
-        raise UnauthorizedError("User did not create an expense with the provided id")
-    return expense_dao.delete_expense(expense_id)
+    return expense_dao.delete_expense(id=expense_id, author_id=user_id)
+
+
+def _describe_error(error: Dict[str, Any]) -> str:
+    # errors about the row as a whole, e.g. one that is not an object, have no location
+    if not error["loc"]:
+        return error["msg"]
+    return f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+
+
+async def get_expenses_by_group_async(group_id: int, user_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Gets expenses for a given group on the async engine
+
+    :param group_id: id of group to get expenses for
+    :param user_id: id of user making the query
+    :param created_before: only return expenses created before this date
+    :param created_after: only return expenses created after this date
+    :param limit: maximum number of expenses to return
+    :param cursor: only return expenses after the one this cursor was created from
+    :return list of expense rows shaped like Expense
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not await expense_group_service.user_is_member_async(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return await expense_dao.get_expenses_by_group_async(group_id=group_id, created_before=created_before, created_after=created_after, limit=limit, cursor=cursor)
+
+
+async def stream_expenses_by_group_async(group_id: int, user_id: int, created_before: Optional[datetime] = None, created_after: Optional[datetime] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams expenses for a given group on the async engine. Membership is checked before the stream is returned
+
+    :param group_id: id of group to get expenses for
+    :param user_id: id of user making the query
+    :param created_before: only return expenses created before this date
+    :param created_after: only return expenses created after this date
+    :return async iterator over expense rows shaped like Expense
+    :except UnauthorizedError if the user does not belong to the requested group
+    """
+    if not await expense_group_service.user_is_member_async(user_id, group_id):
+        raise UnauthorizedError("User does not belong to the requested group")
+    return expense_dao.stream_expenses_by_group_async(group_id=group_id, created_before=created_before, created_after=created_after)
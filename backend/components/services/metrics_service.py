@@ -0,0 +1,145 @@
+from typing import List
+
+from components import db
+from components.services import auth_service, expense_group_service
+from components.settings import get_settings
+from components.utils.metrics import (Collected, Counter, Histogram, Sample,
+                                      render)
+from components.utils.request_context import QueryStats
+
+SETTINGS = get_settings()
+
+_requests = Counter(
+    "expense_tracker_http_requests_total",
+    "Requests handled by route, method and status",
+    ("route", "method", "status"),
+)
+_request_seconds = Histogram(
+    "expense_tracker_http_request_duration_seconds",
+    "Time to handle a request by route and method",
+    ("route", "method"),
+)
+_exceptions = Counter(
+    "expense_tracker_exceptions_total",
+    "Exceptions raised while handling a request by route and exception type",
+    ("route", "exception"),
+)
+_db_statements = Counter(
+    "expense_tracker_db_statements_total",
+    "Sql statements executed by route",
+    ("route",),
+)
+_db_seconds = Counter(
+    "expense_tracker_db_seconds_total",
+    "Time spent executing sql statements by route",
+    ("route",),
+)
+
+
+def observe_request(route: str, method: str, status: int, seconds: float, stats: QueryStats) -> None:
+    """
+    Records a handled request
+
+    :param route: name of the route that handled the request
+    :param method: http method
+    :param status: response status code
+    :param seconds: time spent handling the request
+    :param stats: statements executed for the request
+    """
+    _requests.inc(route, method, str(status))
+    _request_seconds.observe(seconds, route, method)
+    if stats.statements:
+        _db_statements.inc(route, amount=stats.statements)
+        _db_seconds.inc(route, amount=stats.db_seconds)
+
+
+def record_exception(route: str, exception: BaseException) -> None:
+    """
+    Records an exception raised while handling a request
+
+    :param route: name of the route that raised it
+    :param exception: exception raised
+    """
+    _exceptions.inc(route, type(exception).__name__)
+
+
+def render_metrics() -> str:
+    """
+    Renders every metric in the prometheus text exposition format, gauges are read as they are rendered
+
+    :return exposition text
+    """
+    return render(_METRICS)
+
+
+def _pools() -> List[str]:
+    return ["sync", "async"] if SETTINGS.async_enabled else ["sync"]
+
+
+def _pool_samples(field: str) -> List[Sample]:
+    return [("", (pool,), getattr(db.get_pool_stats(pool == "async"), field)) for pool in _pools()]
+
+
+def _cache_samples(field: str) -> List[Sample]:
+    return [
+        ("", ("principal",), getattr(auth_service.get_principal_cache_stats(), field)),
+        ("", ("membership",), getattr(expense_group_service.get_membership_cache_stats(), field)),
+    ]
+
+
+def _hash_seconds() -> List[Sample]:
+    stats = auth_service.get_hasher_stats()
+    return [("_sum", (), stats.total_seconds), ("_count", (), stats.completed)]
+
+
+_METRICS = [
+    _requests,
+    _request_seconds,
+    _exceptions,
+    _db_statements,
+    _db_seconds,
+    Collected(
+        "expense_tracker_password_hash_seconds", "Time spent hashing and verifying passwords with bcrypt",
+        "summary", (), _hash_seconds,
+    ),
+    Collected(
+        "expense_tracker_password_hash_in_flight", "Password operations running or queued",
+        "gauge", (), lambda: [("", (), auth_service.get_hasher_stats().in_flight)],
+    ),
+    Collected(
+        "expense_tracker_password_hash_rejected_total", "Password operations rejected because the queue was full",
+        "counter", (), lambda: [("", (), auth_service.get_hasher_stats().rejected)],
+    ),
+    Collected(
+        "expense_tracker_cache_hits_total", "Auth cache lookups that found a value",
+        "counter", ("cache",), lambda: _cache_samples("hits"),
+    ),
+    Collected(
+        "expense_tracker_cache_misses_total", "Auth cache lookups that found no value",
+        "counter", ("cache",), lambda: _cache_samples("misses"),
+    ),
+    Collected(
+        "expense_tracker_cache_entries", "Values held by an auth cache",
+        "gauge", ("cache",), lambda: _cache_samples("size"),
+    ),
+    Collected(
+        "expense_tracker_db_pool_size", "Connections the pool keeps open",
+        "gauge", ("pool",), lambda: _pool_samples("size"),
+    ),
+    Collected(
+        "expense_tracker_db_pool_checked_out", "Connections currently checked out of the pool",
+        "gauge", ("pool",), lambda: _pool_samples("checked_out"),
+    ),
+    Collected(
+        "expense_tracker_db_pool_overflow", "Connections open beyond the pool size",
+        "gauge", ("pool",), lambda: _pool_samples("overflow"),
+    ),
+    Collected(
+        "expense_tracker_db_pool_checkouts_total", "Connections checked out of either pool",
+        "counter", (), lambda: [("", (), db.get_pool_stats().checkouts)],
+    ),
+    Collected(
+        "expense_tracker_db_pool_wait_seconds_total", "Time spent waiting to check a connection out of either pool",
+        "counter", (), lambda: [("", (), db.get_pool_stats().total_wait_seconds)],
+    ),
+]
@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+from typing import Optional
+
+from components.services import auth_service
+from components.settings import get_settings
+from components.utils.cache import TTLCache
+from components.utils.exceptions import CredentialsError, DoesNotExistError, UnauthorizedError
+from components.utils.profiler import Sampler
+from components.utils.request_context import RequestState
+
+SETTINGS = get_settings()
+
+# finished request profiles are kept this long for the client to fetch
+PROFILE_TTL_SECONDS = 600
+
+_request_profiles = TTLCache(
+    max_size=SETTINGS.profiler_config.retained_profiles,
+    ttl_seconds=PROFILE_TTL_SECONDS,
+)
+
+
+def is_enabled() -> bool:
+    return SETTINGS.profiler_config.enabled
+
+
+def authorize(username: str) -> None:
+    """
+    Checks a user may profile this worker
+
+    :param username: username of the user asking
+    :except DoesNotExistError if profiling is disabled, so the feature is not advertised
+    :except UnauthorizedError if the user is not allowed to profile
+    """
+    if not is_enabled():
+        raise DoesNotExistError("Profiling is not enabled")
+    if username not in SETTINGS.profiler_config.usernames:
+        raise UnauthorizedError(f"User {username} is not allowed to profile")
+
+
+def profile_worker(seconds: float, interval_ms: Optional[float] = None) -> str:
+    """
+    Samples every thread of this worker, except the calling one, for a while
+
+    :param seconds: how long to sample for, capped at the configured maximum
+    :param interval_ms: time between samples
+    :return collapsed stacks
+    """
+    seconds = min(seconds, SETTINGS.profiler_config.max_seconds)
+    sampler = Sampler(
+        interval_seconds=(interval_ms or SETTINGS.profiler_config.interval_ms) / 1000,
+        max_seconds=seconds,
+        exclude={threading.get_ident()},
+    )
+    sampler.start()
+    time.sleep(seconds)
+    return sampler.stop()
+
+
+def start_request_profile(state: RequestState, authorization: Optional[str]) -> Optional[Sampler]:
+    """
+    Starts sampling the threads that work on a request, provided it carries the token of a user allowed to
+    profile. The calling thread, the event loop for a request entering the app, is sampled throughout and
+    other threads from when they first look up the request's state
+
+    Threads are sampled whole until the request ends, not just while they work for it: the event loop runs
+    every concurrent request, and a threadpool worker stays sampled after it moves on to other requests.
+    A request's profile therefore includes concurrent traffic, it is exact only on an otherwise idle worker
+
+    :param state: state of the request to profile
+    :param authorization: the request's Authorization header
+    :return sampler to hand to finish_request_profile, None if the request may not be profiled
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        authorize(auth_service.get_token_username(token))
+    except (CredentialsError, DoesNotExistError, UnauthorizedError):
+        return None
+    state.profiled_threads = {threading.get_ident()}
+    sampler = Sampler(
+        interval_seconds=SETTINGS.profiler_config.interval_ms / 1000,
+        max_seconds=SETTINGS.profiler_config.max_seconds,
+        threads=state.profiled_threads,
+    )
+    sampler.start()
+    return sampler
+
+
+def finish_request_profile(sampler: Sampler) -> str:
+    """
+    Stops sampling a request and keeps its profile for a while
+
+    :param sampler: sampler returned by start_request_profile
+    :return id to fetch the profile with
+    """
+    profile_id = uuid.uuid4().hex
+    _request_profiles.set(profile_id, sampler.stop())
+    return profile_id
+
+
+def get_request_profile(profile_id: str) -> str:
+    """
+    Gets the profile of a flagged request
+
+    :param profile_id: id returned with the request
+    :return collapsed stacks
+    :except DoesNotExistError if there is no such profile, or it has expired
+    """
+    profile = _request_profiles.get(profile_id)
+    if profile is None:
+        raise DoesNotExistError(f"Profile {profile_id} does not exist")
+    return profile
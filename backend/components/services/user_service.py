@@ -1,19 +1,34 @@
-from typing import List
-from components.models.user import User
+from typing import Any, Dict, List, Optional
 from components.daos import auth_dao, user_dao
+from components.services import auth_service
 
 def create_user(username: str, hashed_password: str, first_name: str, last_name: str, email: str) -> None:
     """
-    Creates a user by adding them to the user and auth user tables
+    Creates a user by adding them to the user and auth user tables, both rows commit together with the request
     """
     user_id = user_dao.create_user(username, first_name, last_name, email)
     auth_dao.create_user(user_id, username, hashed_password)
+    auth_service.invalidate_principal(username)
 
-def get_users() -> List[User]:
+def get_users(limit: Optional[int] = None, cursor: Optional[str] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Gets all users
+    Gets users ordered by id
 
-    :return list of users
+    :param limit: maximum number of users to return
+    :param cursor: only return users after the one this cursor was created from
+    :param search: only return users whose username, first name or last name starts with this prefix
+    :return list of user rows shaped like User
     """
-    return user_dao.get_users()
-    
+    return user_dao.get_users(limit=limit, cursor=cursor, search=search)
+
+
+async def get_users_async(limit: Optional[int] = None, cursor: Optional[str] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Gets users ordered by id on the async engine
+
+    :param limit: maximum number of users to return
+    :param cursor: only return users after the one this cursor was created from
+    :param search: only return users whose username, first name or last name starts with this prefix
+    :return list of user rows shaped like User
+    """
+    return await user_dao.get_users_async(limit=limit, cursor=cursor, search=search)
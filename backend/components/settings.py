@@ -1,6 +1,17 @@
+import itertools
+import os
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
+class ReplicaConfig(BaseModel):
+    # a replica serves sync reads when it has a url and async reads when it has an async url, reads of
+    # either kind use the primary when no replica can serve them
+    url: Optional[str] = None
+    async_url: Optional[str] = None
+
+
 class DBConfig(BaseModel):
     dialect: str = ""
     driver: str = ""
@@ -9,10 +20,59 @@ class DBConfig(BaseModel):
     host: str = ""
     port: str = ""
     database: str = ""
+    async_driver: str = ""
+    # complete connection urls, when set they are used instead of the fields above
+    url: Optional[str] = None
+    async_url: Optional[str] = None
+    replicas: List[ReplicaConfig] = []
+    # how often a replica is probed, and how long one that failed is left out of rotation
+    replica_check_interval_seconds: float = 5
+
+
+class PoolConfig(BaseModel):
+    size: int = 5
+    max_overflow: int = 10
+    timeout_seconds: float = 30
+    recycle_seconds: int = 1800
+    pre_ping: bool = True
+
+
+class AuthConfig(BaseModel):
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 60
+    membership_cache_size: int = 10000
+    membership_cache_ttl_seconds: float = 5
+
+
+class HasherConfig(BaseModel):
+    workers: int = 2
+    # operations admitted beyond those running, kept well below the request threadpool's 40 threads
+    max_queue: int = 8
+
+
+class InstrumentationConfig(BaseModel):
+    # requests and statements taking at least this long are logged as warnings
+    slow_request_ms: float = 500
+    slow_statement_ms: float = 100
+
+
+class ProfilerConfig(BaseModel):
+    enabled: bool = False
+    # only these users may profile, everyone else is refused even when enabled
+    usernames: List[str] = []
+    interval_ms: float = 5
+    max_seconds: float = 60
+    retained_profiles: int = 100
 
 
 class Settings(BaseModel):
     db_config: DBConfig
+    pool_config: PoolConfig = PoolConfig()
+    auth_config: AuthConfig = AuthConfig()
+    hasher_config: HasherConfig = HasherConfig()
+    instrumentation_config: InstrumentationConfig = InstrumentationConfig()
+    profiler_config: ProfilerConfig = ProfilerConfig()
+    async_enabled: bool = False
 
 
 def get_settings():
@@ -25,5 +85,53 @@ def get_settings():
             host="db",
             port="3306",
             database="expense_tracker",
-        )
+            async_driver="aiomysql",
+            url=os.environ.get("EXPENSE_TRACKER_DB_URL"),
+            async_url=os.environ.get("EXPENSE_TRACKER_ASYNC_DB_URL"),
+            replicas=_replicas_from_environment(),
+            replica_check_interval_seconds=5,
+        ),
+        pool_config=PoolConfig(
+            size=5,
+            max_overflow=10,
+            timeout_seconds=30,
+            recycle_seconds=1800,
+            pre_ping=True,
+        ),
+        auth_config=AuthConfig(
+            principal_cache_size=10000,
+            principal_cache_ttl_seconds=60,
+            membership_cache_size=10000,
+            membership_cache_ttl_seconds=5,
+        ),
+        hasher_config=HasherConfig(
+            workers=2,
+            max_queue=8,
+        ),
+        instrumentation_config=InstrumentationConfig(
+            slow_request_ms=500,
+            slow_statement_ms=100,
+        ),
+        profiler_config=ProfilerConfig(
+            enabled=os.environ.get("EXPENSE_TRACKER_PROFILER_ENABLED", "").lower() in ("1", "true"),
+            usernames=[username for username in os.environ.get("EXPENSE_TRACKER_PROFILER_USERS", "").split(",") if username],
+            interval_ms=5,
+            max_seconds=60,
+            retained_profiles=100,
+        ),
+        async_enabled=os.environ.get("EXPENSE_TRACKER_ASYNC_ENABLED", "").lower() in ("1", "true"),
     )
+
+
+def _replicas_from_environment() -> List[ReplicaConfig]:
+    """
+    Reads replica urls from comma separated environment variables, async urls pair with sync urls by position
+    and an empty entry leaves that replica without one
+    """
+    urls = os.environ.get("EXPENSE_TRACKER_DB_REPLICA_URLS", "").split(",")
+    async_urls = os.environ.get("EXPENSE_TRACKER_ASYNC_DB_REPLICA_URLS", "").split(",")
+    return [
+        ReplicaConfig(url=url or None, async_url=async_url or None)
+        for url, async_url in itertools.zip_longest(urls, async_urls)
+        if url or async_url
+    ]
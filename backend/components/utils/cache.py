@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from components.models.cache_stats import CacheStats
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time to live
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Gets a cached value
+
+        :param key: key the value was cached under
+        :return value if cached and not expired, else None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Caches a value, evicting the least recently used entry if the cache is full
+
+        :param key: key to cache the value under
+        :param value: value to cache
+        :param ttl_seconds: time to live, capped at the cache's time to live
+        """
+        if self._max_size <= 0:
+            return
+        ttl = self._ttl_seconds if ttl_seconds is None else min(ttl_seconds, self._ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes a value from the cache if present
+
+        :param key: key the value was cached under
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every value from the cache
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """
+        Gets a snapshot of the cache's size and hit counts
+
+        :return cache stats
+        """
+        with self._lock:
+            return CacheStats(size=len(self._entries), hits=self.hits, misses=self.misses)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,54 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Mapping
+
+from components.models.group_version import GroupVersion
+
+ETAG_HEADER = "ETag"
+LAST_MODIFIED_HEADER = "Last-Modified"
+
+
+def validator_headers(version: GroupVersion) -> Dict[str, str]:
+    """
+    Builds the cache validator headers for a versioned resource
+
+    :param version: version of the groups the resource is built from
+    :return ETag and, when known, Last-Modified headers
+    """
+    headers = {ETAG_HEADER: f'W/"{version.tag}"'}
+    if version.modified_date is not None:
+        headers[LAST_MODIFIED_HEADER] = format_datetime(version.modified_date.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def is_not_modified(request_headers: Mapping[str, str], version: GroupVersion) -> bool:
+    """
+    Evaluates a conditional GET. If-None-Match takes precedence over If-Modified-Since, as in RFC 9110
+
+    :param request_headers: headers of the incoming request
+    :param version: current version of the requested resource
+    :return True if the client's copy is current and a 304 can be sent
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return version.tag in {_opaque_tag(etag) for etag in if_none_match.split(",")}
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is None or version.modified_date is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # http dates only carry whole seconds
+    return version.modified_date.replace(microsecond=0, tzinfo=timezone.utc) <= since
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    return etag.strip('"')
@@ -27,3 +27,15 @@ class CredentialsError(Exception):
     Error when a user tries to log in with invalid credentials
     """
     pass
+
+class InvalidCursorError(Exception):
+    """
+    Error when a pagination cursor cannot be decoded
+    """
+    pass
+
+class ServiceBusyError(Exception):
+    """
+    Error when a bounded resource is saturated and the request should be retried later
+    """
+    pass
@@ -0,0 +1,141 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# starlette appends the utf-8 charset to text responses
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, LabelValues, float]
+
+
+class Counter:
+    """
+    Thread-safe monotonically increasing count, one series per combination of label values
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """
+        Increments the series for the given label values
+
+        :param label_values: one value per label name, in order
+        :param amount: amount to add
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = _header(self.name, self.documentation, "counter")
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Thread-safe distribution of observed values over fixed cumulative buckets
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._buckets = tuple(sorted(buckets))
+        # per series: count in each bucket (the last one is +Inf), sum of observations
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """
+        Records an observation in the series for the given label values
+
+        :param value: observed value
+        :param label_values: one value per label name, in order
+        """
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self._buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [(label_values, list(counts), total[0]) for label_values, (counts, total) in self._series.items()]
+        lines = _header(self.name, self.documentation, "histogram")
+        for label_values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self._buckets, float("inf")), counts):
+                cumulative += count
+                labels = _labels((*self.label_names, "le"), (*label_values, _number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Collected:
+    """
+    Metric whose samples are read from elsewhere when scraped, e.g. gauges over pool or cache stats
+    """
+
+    def __init__(self, name: str, documentation: str, type: str, label_names: Sequence[str], collect: Callable[[], List[Sample]]):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.label_names = tuple(label_names)
+        # samples are (name suffix such as "_sum" or "", label values, value)
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, self.documentation, self.type)
+        for suffix, label_values, value in self._collect():
+            lines.append(f"{self.name}{suffix}{_labels(self.label_names, label_values)} {_number(value)}")
+        return lines
+
+
+def render(metrics: Sequence) -> str:
+    """
+    Renders metrics in the prometheus text exposition format
+
+    :param metrics: counters, histograms and collected metrics to render
+    :return exposition text
+    """
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _header(name: str, documentation: str, type: str) -> List[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {type}"]
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
@@ -0,0 +1,42 @@
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+import orjson
+
+# rows encoded per chunk, streaming row by row costs a threadpool hop and an asgi send per row
+CHUNK_SIZE = 500
+
+
+def ndjson_chunks(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Encodes rows as newline delimited json, several rows per chunk
+
+    :param rows: rows to encode
+    :return iterator over encoded chunks
+    """
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield _encode(chunk)
+
+
+async def ndjson_chunks_async(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Encodes rows from an async iterator as newline delimited json, several rows per chunk
+
+    :param rows: rows to encode
+    :return async iterator over encoded chunks
+    """
+    chunk: List[Dict[str, Any]] = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield _encode(chunk)
+            chunk = []
+    if chunk:
+        yield _encode(chunk)
+
+
+def _encode(rows: List[Dict[str, Any]]) -> bytes:
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows)
@@ -0,0 +1,40 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List
+
+from components.utils.exceptions import InvalidCursorError
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encodes the sort key of the last row on a page into an opaque cursor
+
+    :param values: sort key values, datetimes are encoded in iso format
+    :return url safe cursor
+    """
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    """
+    Decodes a cursor created by encode_cursor
+
+    :param cursor: cursor to decode
+    :param types: expected type of each sort key value
+    :return sort key values
+    :except InvalidCursorError if the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            raise ValueError("unexpected number of values")
+        return [
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for value, type_ in zip(values, types)
+        ]
+    except Exception:
+        raise InvalidCursorError("Invalid pagination cursor")
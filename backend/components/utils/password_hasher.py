@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from components.models.hasher_stats import HasherStats
+from components.utils.exceptions import ServiceBusyError
+
+_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    hashed_password = _pwd_context.hash(password)
+    return hashed_password, time.perf_counter() - start
+
+
+def _verify(password: str, hashed_password: str) -> Tuple[bool, float]:
+    start = time.perf_counter()
+    verified = _pwd_context.verify(password, hashed_password)
+    return verified, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, size-limited process pool so hashing cannot starve the request threadpool.
+    Callers await the pool rather than wait on a thread, and at most workers + max_queue operations are
+    admitted at once, callers beyond that are rejected straight away. With zero workers hashing runs on
+    the event loop's default executor
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self._workers = workers
+        self._capacity = max(workers, 1) + max_queue
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        """
+        Hashes a plaintext password
+
+        :param password: plaintext password to hash
+        :return hashed password
+        :except ServiceBusyError if the hashing queue is full
+        """
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """
+        Verifies a plaintext password against a hash
+
+        :param password: plaintext password
+        :param hashed_password: hash to verify against
+        :return True if the password matches
+        :except ServiceBusyError if the hashing queue is full
+        """
+        return await self._run(_verify, password, hashed_password)
+
+    def stats(self) -> HasherStats:
+        """
+        Gets a snapshot of the hasher's queue
+
+        :return hasher stats
+        """
+        with self._lock:
+            return HasherStats(
+                workers=self._workers,
+                in_flight=self._in_flight,
+                queue_depth=max(self._in_flight - max(self._workers, 1), 0),
+                completed=self._completed,
+                rejected=self._rejected,
+                total_seconds=self._total_seconds,
+            )
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes, they are restarted on next use
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn: Callable[..., Tuple[Any, float]], *args: Any) -> Any:
+        with self._lock:
+            if self._in_flight >= self._capacity:
+                self._rejected += 1
+                raise ServiceBusyError("Too many concurrent password operations, try again later")
+            self._in_flight += 1
+        try:
+            if self._workers <= 0:
+                result, elapsed = await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+            else:
+                executor = self._get_executor()
+                try:
+                    result, elapsed = await asyncio.wrap_future(executor.submit(fn, *args))
+                except BrokenProcessPool:
+                    # a worker died, e.g. killed for memory; start a fresh pool on next use
+                    self._reset_executor(executor)
+                    raise ServiceBusyError("Password worker pool restarted, try again later")
+            with self._lock:
+                self._completed += 1
+                self._total_seconds += elapsed
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self, broken: Executor) -> None:
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
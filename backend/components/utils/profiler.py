@@ -0,0 +1,74 @@
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, Optional, Set, Tuple
+
+
+class Sampler:
+    """
+    Samples the stacks of running threads from a background thread and aggregates them as collapsed stacks,
+    the text format flamegraph.pl, speedscope and similar flame graph tools read. Nothing is traced between
+    samples, so the sampled code runs at full speed
+    """
+
+    def __init__(self, interval_seconds: float, max_seconds: float, threads: Optional[Set[int]] = None, exclude: Optional[Set[int]] = None):
+        """
+        :param interval_seconds: time between samples
+        :param max_seconds: sampling stops on its own after this long
+        :param threads: ids of the threads to sample, read on every sample so it may grow, None for all threads
+        :param exclude: ids of threads never to sample
+        """
+        self._interval_seconds = interval_seconds
+        self._max_seconds = max_seconds
+        self._threads = threads
+        self._exclude = set(exclude or ())
+        self._stacks: Counter = Counter()
+        self._labels: Dict[CodeType, str] = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> str:
+        """
+        Stops sampling
+
+        :return collapsed stacks, one "root;...;leaf count" line per distinct stack, most sampled first
+        """
+        self._stopped.set()
+        self._thread.join()
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + self._max_seconds
+        while not self._stopped.wait(self._interval_seconds) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self._exclude:
+                    continue
+                if self._threads is not None and ident not in self._threads:
+                    continue
+                self._stacks[(names.get(ident, str(ident)), *self._stack(frame))] += 1
+
+    def _stack(self, frame: Optional[FrameType]) -> Tuple[str, ...]:
+        stack = []
+        while frame is not None:
+            label = self._labels.get(frame.f_code)
+            if label is None:
+                label = self._labels[frame.f_code] = _label(frame)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", code.co_filename)
+    name = getattr(code, "co_qualname", code.co_name)
+    # ';' separates frames and ' ' the count in the collapsed format
+    return f"{module}:{name}".replace(";", ":").replace(" ", "_")
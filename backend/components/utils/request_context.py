@@ -0,0 +1,72 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+
+class QueryStats:
+    """
+    Tallies the sql statements executed on behalf of a request
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+
+    def record(self, rows: int, seconds: float) -> None:
+        self.statements += 1
+        self.rows += rows
+        self.db_seconds += seconds
+
+
+class RequestState:
+    """
+    State shared by everything that runs on behalf of a single http request
+    """
+
+    def __init__(self):
+        self.memberships: Dict[int, FrozenSet[int]] = {}
+        # unit of work every dao call in the request shares, opened on first use
+        self.session: Optional[Session] = None
+        # whether read-only dao calls may use a replica, turned off by the request's first write
+        self.replica_reads = False
+        self.replica_session: Optional[Session] = None
+        # run once the unit of work commits, e.g. to drop cache entries its writes made stale
+        self.after_commit: List[Callable[[], None]] = []
+        self.query_stats = QueryStats()
+        # set while the request is being profiled, collects the threads that did work for it. Threads are
+        # never removed, since a threadpool worker has no hook for when it finishes the request's work
+        self.profiled_threads: Optional[Set[int]] = None
+
+
+_request_state: ContextVar[Optional[RequestState]] = ContextVar("request_state", default=None)
+
+
+def get_request_state() -> Optional[RequestState]:
+    """
+    Gets the state of the request currently being handled
+
+    :return request state, None outside of a request
+    """
+    state = _request_state.get()
+    if state is not None and state.profiled_threads is not None:
+        # every layer looks the state up, which is how a profiled request's threadpool workers are found
+        state.profiled_threads.add(threading.get_ident())
+    return state
+
+
+@contextmanager
+def request_scope() -> Iterator[RequestState]:
+    """
+    Opens a fresh request state for the duration of the block. The state object is shared by reference,
+    so threadpool workers running on a copy of the context see and mutate the same state
+    """
+    state = RequestState()
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
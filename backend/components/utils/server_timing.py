@@ -0,0 +1,17 @@
+from components.utils.request_context import QueryStats
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+def server_timing(stats: QueryStats, total_seconds: float) -> str:
+    """
+    Formats a request's timings as a Server-Timing header value
+
+    :param stats: statements executed for the request
+    :param total_seconds: time spent handling the request
+    :return header value with the db time, statement and row counts and the total time
+    """
+    return (
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} statements, {stats.rows} rows", '
+        f'total;dur={total_seconds * 1000:.2f}'
+    )
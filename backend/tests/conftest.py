@@ -0,0 +1,33 @@
+"""
+Fixtures shared by the tests, which run against a throwaway sqlite database. The app reads its database url
+from the environment when the settings are first imported, so it is pointed at the test database before any
+component is. Run from the backend directory with python -m pytest
+"""
+import os
+import tempfile
+
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="expense-tracker-tests-"), "test.db")
+os.environ["EXPENSE_TRACKER_DB_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ["EXPENSE_TRACKER_ASYNC_DB_URL"] = f"sqlite+aiosqlite:///{_DB_PATH}"
+os.environ.pop("EXPENSE_TRACKER_DB_REPLICA_URLS", None)
+os.environ.pop("EXPENSE_TRACKER_ASYNC_DB_REPLICA_URLS", None)
+
+import pytest
+from sqlalchemy.engine import Engine
+
+from components import db
+from components.models.orm_models import Base
+from components.services import auth_service, expense_group_service
+
+
+@pytest.fixture
+def engine() -> Engine:
+    """
+    Engine of an empty database with every table created, dropped again after the test
+    """
+    engine = db.get_engine()
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    auth_service.clear_principal_cache()
+    expense_group_service._membership_cache.clear()
@@ -0,0 +1,27 @@
+"""
+Checks bulk expense creation reports bad rows individually instead of rejecting the whole upload
+"""
+from fastapi.testclient import TestClient
+
+from components.daos import auth_dao, expense_group_dao, user_dao
+from components.endpoints.endpoints import app
+from components.services import auth_service
+
+
+def test_bulk_create_reports_rows_that_are_not_objects(engine):
+    user_id = user_dao.create_user("alice", "Alice", "A", "alice@example.com")
+    auth_dao.create_user(user_id, "alice", "not a real hash")
+    group_id = expense_group_dao.create_group(user_id, "trip", [])
+    headers = {"Authorization": f"Bearer {auth_service.create_access_token('alice')}"}
+
+    response = TestClient(app).post(
+        f"/groups/{group_id}/expenses/bulk",
+        json=[{"title": "a", "price": 1}, {"title": "b"}, {"title": "c", "price": 3}, "zz", None],
+        headers=headers,
+    )
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["created"] == 2
+    assert [error["index"] for error in result["errors"]] == [1, 3, 4]
+    assert result["errors"][1]["error"].startswith("Input should be a valid dictionary")
@@ -0,0 +1,50 @@
+"""
+Checks the hot read paths are answered from an index rather than a table scan, by asking the database for
+the plan of the statements the daos run
+"""
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import Select, text
+from sqlalchemy.engine import Engine
+
+from components.daos import expense_dao, expense_group_dao, predicates
+from components.utils.pagination import encode_cursor
+
+
+def _plan(engine: Engine, stmt: Select) -> List[str]:
+    sql = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as connection:
+        return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def test_group_expenses_use_group_date_index(engine):
+    plan = _plan(engine, expense_dao._expenses_by_group_stmt(1))
+    assert any("USING INDEX ix_expense_group_id_date" in step for step in plan), plan
+    # the index also yields rows in date then id order, so no sort is needed
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_group_expense_pages_use_group_date_index(engine):
+    cursor = encode_cursor(datetime(2024, 1, 1), 10)
+    plan = _plan(engine, expense_dao._expenses_by_group_stmt(1, cursor=cursor).limit(50))
+    assert any("USING INDEX ix_expense_group_id_date" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_groups_use_member_user_index(engine):
+    plan = _plan(engine, expense_group_dao._groups_stmt(1))
+    assert any("expense_group_members USING INDEX ix_expense_group_members_user_id" in step for step in plan), plan
+    assert any("expense_group USING INTEGER PRIMARY KEY" in step for step in plan), plan
+    assert any("user USING INTEGER PRIMARY KEY" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
+
+
+def test_memberships_use_member_user_index(engine):
+    plan = _plan(engine, expense_group_dao._group_ids_for_user_stmt(1))
+    assert any("expense_group_members USING INDEX ix_expense_group_members_user_id" in step for step in plan), plan
+
+
+def test_expense_exists_predicate_uses_primary_key(engine):
+    plan = _plan(engine, predicates.expense_exists(1))
+    assert any("expense USING INTEGER PRIMARY KEY" in step for step in plan), plan
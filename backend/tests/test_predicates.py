@@ -0,0 +1,22 @@
+"""
+Checks every predicate compiles to a single EXISTS query and answers correctly against a seeded database
+"""
+from sqlalchemy.orm import Session
+
+from components.daos import expense_dao, expense_group_dao, predicates, user_dao
+
+
+def _assert_exists_query(stmt) -> None:
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert sql.startswith("SELECT EXISTS"), sql
+
+
+def test_expense_exists(engine):
+    author_id = user_dao.create_user("alice", "Alice", "A", "alice@example.com")
+    group_id = expense_group_dao.create_group(author_id, "trip", [])
+    expense_id = expense_dao.create_expense(author_id, "dinner", 30, group_id)
+
+    _assert_exists_query(predicates.expense_exists(expense_id))
+    with Session(engine) as session:
+        assert session.scalar(predicates.expense_exists(expense_id))
+        assert not session.scalar(predicates.expense_exists(expense_id + 1))
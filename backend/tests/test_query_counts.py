@@ -0,0 +1,57 @@
+"""
+Checks listing endpoints run a fixed number of statements however many rows they return, so an n+1 query
+pattern cannot creep back in
+"""
+from typing import Callable, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from components.daos import auth_dao, expense_group_dao, user_dao
+from components.endpoints.endpoints import app
+from components.services import auth_service, expense_group_service
+
+
+@pytest.fixture
+def client(engine) -> TestClient:
+    return TestClient(app)
+
+
+def _count_statements(engine, request: Callable[[], None]) -> int:
+    statements: List[str] = []
+
+    def record(connection, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    # every request starts with cold auth caches, so each count includes the same lookups
+    auth_service.clear_principal_cache()
+    expense_group_service._membership_cache.clear()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        request()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+def test_get_groups_statements_do_not_grow_with_groups(engine, client):
+    user_id = user_dao.create_user("alice", "Alice", "A", "alice@example.com")
+    auth_dao.create_user(user_id, "alice", "not a real hash")
+    headers = {"Authorization": f"Bearer {auth_service.create_access_token('alice')}"}
+
+    def get_groups(expected: int) -> Callable[[], None]:
+        def request() -> None:
+            response = client.get("/groups", headers=headers)
+            assert response.status_code == 200, response.text
+            assert len(response.json()) == expected
+        return request
+
+    expense_group_dao.create_group(user_id, "group 0", [])
+    one_group = _count_statements(engine, get_groups(1))
+    for index in range(1, 50):
+        expense_group_dao.create_group(user_id, f"group {index}", [])
+    fifty_groups = _count_statements(engine, get_groups(50))
+
+    assert one_group > 0
+    assert one_group == fifty_groups